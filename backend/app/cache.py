@@ -0,0 +1,111 @@
+"""
+In-process response caching keyed by data snapshot
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Tuple
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "30"))
+TILE_CACHE_ENTRIES = int(os.getenv("TILE_CACHE_ENTRIES", "4096"))
+
+class ResponseCache:
+    """Bounded LRU cache with a per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (hit, value); expired entries count as misses"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+class SnapshotVersion:
+    """
+    Tracks the version of the data snapshot currently in the database.
+
+    The loader is awaited at most once per `interval` seconds; when the
+    version it returns differs from the last one seen, every registered
+    listener is called so dependent caches can drop stale entries.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Optional[datetime]]],
+                 interval: float = SNAPSHOT_CHECK_SECONDS):
+        self._loader = loader
+        self.interval = interval
+        self._value: Optional[datetime] = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def on_change(self, listener: Callable[[], None]):
+        self._listeners.append(listener)
+
+    def invalidate(self):
+        """Force the next call to current() to re-read the version"""
+        self._checked_at = float("-inf")
+
+    async def current(self) -> Optional[datetime]:
+        if time.monotonic() - self._checked_at < self.interval:
+            return self._value
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.interval:
+                return self._value
+
+            value = await self._loader()
+            changed = value != self._value
+            self._value = value
+            self._checked_at = time.monotonic()
+
+        if changed:
+            for listener in self._listeners:
+                listener()
+        return value
@@ -2,39 +2,178 @@
 Database models and connection handling
 """
 import os
-from typing import Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional, Tuple, TypeVar
+from app.metrics import DB_POOL_TIMEOUTS, DB_QUERY_ERRORS, DB_QUERY_SECONDS
+from app.pool import BoundedConnectionPool, PoolTimeout
+from app.tracing import TracingConnection, statement_scope
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://app:secret@db:5432/app")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds a query may wait for a connection before failing with PoolTimeout
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections are replaced after this many seconds (0 keeps them forever)
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))
+# Server-side statement_timeout for pooled connections (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Months of history kept per district in district_latest
+DISTRICT_LATEST_MONTHS = int(os.getenv("DISTRICT_LATEST_MONTHS", "3"))
+
+T = TypeVar("T")
 
 # Connection pool
-pool: Optional[SimpleConnectionPool] = None
+pool: Optional[BoundedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# Worker threads that run blocking psycopg2 calls off the event loop.
+# Sized to the pool so a thread never waits on an exhausted pool.
+_executor: Optional[ThreadPoolExecutor] = None
 
 def get_pool():
     global pool
     if pool is None:
-        pool = SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=DATABASE_URL
-        )
+        with _pool_lock:
+            if pool is None:
+                pool = BoundedConnectionPool(
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    dsn=DATABASE_URL,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    validate_after=DB_POOL_VALIDATE_AFTER,
+                    statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+                    connection_factory=TracingConnection
+                )
     return pool
 
-def get_db():
-    """Get database connection from pool"""
-    return get_pool().getconn()
+def get_db(timeout: Optional[float] = None):
+    """Get database connection from pool, waiting up to `timeout` (DB_POOL_TIMEOUT) seconds"""
+    return get_pool().getconn(timeout)
+
+def return_db(conn, close: bool = False):
+    """Return connection to pool; broken or `close`d connections are dropped"""
+    get_pool().putconn(conn, close=close)
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_POOL_MAX,
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+class _QueuedCall:
+    """A run_db call waiting for a DB thread, counted until it starts or is abandoned"""
+    waiting = 0
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.queued = True
+        with self._lock:
+            _QueuedCall.waiting += 1
+
+    def start(self):
+        with self._lock:
+            if self.queued:
+                self.queued = False
+                _QueuedCall.waiting -= 1
+
+def _call_with_connection(fn: Callable[..., T], *args: Any, deadline: float,
+                          queued: Optional[_QueuedCall] = None) -> T:
+    if queued is not None:
+        queued.start()
+    # The wait for a DB thread counts against DB_POOL_TIMEOUT too, so a
+    # call queued past its deadline is shed instead of run late
+    try:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise PoolTimeout(f"No database connection free within {DB_POOL_TIMEOUT:g}s")
+        conn = get_db(remaining)
+    except PoolTimeout:
+        DB_POOL_TIMEOUTS.inc()
+        raise
+    started = time.perf_counter()
+    try:
+        with statement_scope(fn.__name__):
+            return fn(conn, *args)
+    except Exception:
+        DB_QUERY_ERRORS.inc(fn.__name__)
+        raise
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, fn.__name__)
+        return_db(conn)
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run ``fn(conn, *args)`` on a pooled connection in the DB thread pool.
 
-def return_db(conn):
-    """Return connection to pool"""
-    get_pool().putconn(conn)
+    The event loop stays free while the query runs, so concurrent requests
+    overlap their database waits instead of queuing behind each other.
+    Under load calls queue for up to DB_POOL_TIMEOUT seconds, then raise
+    PoolTimeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + DB_POOL_TIMEOUT
+    queued = _QueuedCall()
+    try:
+        return await loop.run_in_executor(
+            get_executor(),
+            partial(_call_with_connection, fn, *args, deadline=deadline, queued=queued)
+        )
+    finally:
+        # Cancelled before a thread picked it up
+        queued.start()
+
+def pool_stats() -> dict:
+    """Pool size, connections checked out or idle, and calls queued for a connection"""
+    current = pool
+    stats = current.stats() if current is not None else {
+        "max": DB_POOL_MAX, "in_use": 0, "idle": 0, "waiting": 0, "discarded": 0,
+    }
+    # Calls submitted to run_db but waiting for a free thread (and so for a
+    # connection, as there is one thread per pooled connection)
+    stats["waiting"] += _QueuedCall.waiting
+    return stats
+
+def close_db():
+    """Shut down the DB thread pool and close all pooled connections"""
+    global pool, _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if pool is not None:
+        pool.closeall()
+        pool = None
+
+# Vector tile geometry per zoom band: (highest zoom served, column). Zooms
+# above the last band are cut from the full-resolution boundary.
+DISTRICT_TILE_LEVELS = ((5, "geom_z5"), (8, "geom_z8"), (11, "geom_z11"))
+# Web Mercator world width in metres and MVT tile extent
+WEB_MERCATOR_WIDTH = 40075016.68557849
+TILE_EXTENT = 4096
+
+def tile_tolerance(zoom: int) -> float:
+    """Simplification tolerance in metres: one tile unit at `zoom`"""
+    return WEB_MERCATOR_WIDTH / (2 ** zoom * TILE_EXTENT)
 
 def init_db():
     """Initialize database schema"""
     conn = get_db()
     try:
         cur = conn.cursor()
+        # Migrations below may rewrite large tables; DB_STATEMENT_TIMEOUT_MS
+        # is meant for request queries
+        cur.execute("SET LOCAL statement_timeout = 0")
         
         # Enable PostGIS
         cur.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
@@ -58,29 +197,85 @@ def init_db():
             ON districts USING GIST(geom);
         """)
         
-        # MGNREGA monthly metrics table
+        # Simplified Web Mercator copies of the boundary for vector tiles,
+        # one per zoom band
+        for _, column in DISTRICT_TILE_LEVELS:
+            cur.execute(f"""
+                ALTER TABLE districts
+                ADD COLUMN IF NOT EXISTS {column} GEOMETRY(MULTIPOLYGON, 3857);
+            """)
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_districts_{column}
+                ON districts USING GIST({column});
+            """)
+        # Bounding boxes were never read; the GIST indexes cover bbox filters
+        for column in ("bbox_min_lon", "bbox_min_lat", "bbox_max_lon", "bbox_max_lat"):
+            cur.execute(f"ALTER TABLE districts DROP COLUMN IF EXISTS {column};")
+        
+        cur.execute(f"""
+            SELECT id FROM districts
+            WHERE geom IS NOT NULL AND {DISTRICT_TILE_LEVELS[0][1]} IS NULL
+        """)
+        unsimplified = [row[0] for row in cur.fetchall()]
+        if unsimplified:
+            refresh_district_geometries(cur, unsimplified)
+        
+        # MGNREGA monthly metrics table, one partition per year
+        _create_mgnrega_monthly(cur)
+        
+        # Surrogate district key and change-detection hash for tables
+        # created before they existed
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS mgnrega_monthly (
-                id SERIAL PRIMARY KEY,
-                state_name TEXT NOT NULL,
-                district_name TEXT NOT NULL,
-                state_code TEXT,
-                district_code TEXT,
-                year INT NOT NULL,
-                month INT NOT NULL,
-                persondays NUMERIC DEFAULT 0,
-                total_households_worked INT DEFAULT 0,
-                avg_days_per_household NUMERIC DEFAULT 0,
-                wages_lakhs NUMERIC DEFAULT 0,
-                women_persondays NUMERIC DEFAULT 0,
-                women_percentage NUMERIC DEFAULT 0,
-                snapshot_date TIMESTAMP WITH TIME ZONE DEFAULT now(),
-                raw JSONB,
-                UNIQUE(state_name, district_name, year, month)
-            );
+            ALTER TABLE mgnrega_monthly
+            ADD COLUMN IF NOT EXISTS district_id INT REFERENCES districts(id) ON DELETE SET NULL;
+        """)
+        cur.execute("""
+            ALTER TABLE mgnrega_monthly ADD COLUMN IF NOT EXISTS content_hash TEXT;
+        """)
+        
+        # Source payloads live outside the hot metrics table. Archives from
+        # before they were kept per district are split up first
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'mgnrega_raw' AND column_name = 'payloads'
+        """)
+        if cur.fetchone():
+            split_raw_archive(cur)
+        _create_mgnrega_raw(cur)
+        
+        # State averages are a table maintained incrementally by ingestion
+        # (rebuilt below). Earlier versions used a materialized view over
+        # mgnrega_monthly, which would block the migrations that follow
+        cur.execute("""
+            SELECT relkind FROM pg_class
+            WHERE oid = to_regclass('state_monthly_averages')
+        """)
+        existing = cur.fetchone()
+        if existing and existing[0] == 'm':
+            cur.execute("DROP MATERIALIZED VIEW state_monthly_averages;")
+        
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'mgnrega_monthly' AND column_name = 'raw'
         """)
+        if cur.fetchone():
+            offload_raw_payloads(cur)
         
-        # Indexes for fast lookups
+        # Tables created before partitioning are migrated in place
+        cur.execute("""
+            SELECT relkind FROM pg_class
+            WHERE oid = to_regclass('mgnrega_monthly')
+        """)
+        if cur.fetchone()[0] == 'r':
+            migrate_mgnrega_to_partitions(cur)
+        
+        # Before the secondary indexes exist, so a large backfill after a
+        # migration does not leave them bloated
+        backfill_district_ids(cur)
+        
+        # Indexes for fast lookups (created on every partition)
         cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_mgnrega_lookup 
             ON mgnrega_monthly (state_name, district_name, year, month);
@@ -91,28 +286,144 @@ def init_db():
             ON mgnrega_monthly (snapshot_date);
         """)
         
-        # Materialized view for state averages
+        # Covering index so per-district trend/current reads are index-only
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_mgnrega_district_period
+            ON mgnrega_monthly (district_id, year, month)
+            INCLUDE (persondays, total_households_worked, avg_days_per_household,
+                     wages_lakhs, women_persondays, women_percentage, snapshot_date);
+        """)
+        
+        # Keeps finding rows that still need a district_id cheap
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_mgnrega_unresolved
+            ON mgnrega_monthly (state_name, district_name)
+            WHERE district_id IS NULL;
+        """)
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS state_monthly_averages (
+                state_name TEXT NOT NULL,
+                year INT NOT NULL,
+                month INT NOT NULL,
+                district_count INT NOT NULL DEFAULT 0,
+                sum_persondays NUMERIC DEFAULT 0,
+                sum_households NUMERIC DEFAULT 0,
+                sum_days_per_household NUMERIC DEFAULT 0,
+                sum_wages NUMERIC DEFAULT 0,
+                sum_women_pct NUMERIC DEFAULT 0,
+                avg_persondays NUMERIC GENERATED ALWAYS AS
+                    (sum_persondays / NULLIF(district_count, 0)) STORED,
+                avg_households NUMERIC GENERATED ALWAYS AS
+                    (sum_households / NULLIF(district_count, 0)) STORED,
+                avg_days_per_household NUMERIC GENERATED ALWAYS AS
+                    (sum_days_per_household / NULLIF(district_count, 0)) STORED,
+                avg_wages NUMERIC GENERATED ALWAYS AS
+                    (sum_wages / NULLIF(district_count, 0)) STORED,
+                avg_women_pct NUMERIC GENERATED ALWAYS AS
+                    (sum_women_pct / NULLIF(district_count, 0)) STORED,
+                snapshot_date TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (state_name, year, month)
+            );
+        """)
+        
+        # Built in full when the table is new or replaces the view
+        if existing is None or existing[0] == 'm':
+            refresh_state_monthly_averages(cur)
+        
+        # Snapshot metadata maintained by ingestion (single row, id = 1),
+        # so the API never has to scan mgnrega_monthly for MAX(snapshot_date)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_metadata (
+                id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                latest_snapshot TIMESTAMP WITH TIME ZONE,
+                total_rows BIGINT DEFAULT 0,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+            );
+        """)
+        # When district boundaries were last (re)loaded; part of the version
+        # the API keys its caches on (see queries.get_data_version)
+        cur.execute("""
+            ALTER TABLE snapshot_metadata
+            ADD COLUMN IF NOT EXISTS boundaries_updated_at TIMESTAMP WITH TIME ZONE;
+        """)
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS state_snapshot_metadata (
+                state_name TEXT PRIMARY KEY,
+                last_updated TIMESTAMP WITH TIME ZONE,
+                row_count BIGINT DEFAULT 0,
+                last_run_rows INT DEFAULT 0
+            );
+        """)
+        
+        # Ingestion watermarks and crash-resume checkpoints per state
+        for column in (
+            "watermark_year INT",
+            "watermark_month INT",
+            "resume_segment INT",
+            "resume_page INT",
+            "run_status TEXT",
+            "run_started_at TIMESTAMP WITH TIME ZONE",
+            # Start of the latest attempt; a resumed run keeps run_started_at
+            "attempt_started_at TIMESTAMP WITH TIME ZONE",
+            "run_finished_at TIMESTAMP WITH TIME ZONE",
+            "last_error TEXT",
+            "last_run_rejected INT",
+            "failed_runs INT NOT NULL DEFAULT 0",
+            # Earliest run start whose rows are not yet in the derived tables
+            "refresh_pending_since TIMESTAMP WITH TIME ZONE",
+        ):
+            cur.execute(f"ALTER TABLE state_snapshot_metadata ADD COLUMN IF NOT EXISTS {column};")
+        
+        # Seed metadata once from existing data
         cur.execute("""
-            CREATE MATERIALIZED VIEW IF NOT EXISTS state_monthly_averages AS
-            SELECT 
-                state_name,
-                year,
-                month,
-                AVG(persondays) as avg_persondays,
-                AVG(total_households_worked) as avg_households,
-                AVG(avg_days_per_household) as avg_days_per_household,
-                AVG(wages_lakhs) as avg_wages,
-                AVG(women_percentage) as avg_women_pct,
-                MAX(snapshot_date) as snapshot_date
+            INSERT INTO state_snapshot_metadata (state_name, last_updated, row_count)
+            SELECT state_name, MAX(snapshot_date), COUNT(*)
             FROM mgnrega_monthly
-            GROUP BY state_name, year, month;
+            WHERE NOT EXISTS (SELECT 1 FROM state_snapshot_metadata)
+            GROUP BY state_name
+            ON CONFLICT (state_name) DO NOTHING;
+        """)
+        
+        cur.execute("""
+            INSERT INTO snapshot_metadata (id, latest_snapshot, total_rows)
+            SELECT 1, MAX(last_updated), COALESCE(SUM(row_count), 0)
+            FROM state_snapshot_metadata
+            WHERE NOT EXISTS (SELECT 1 FROM snapshot_metadata)
+            ON CONFLICT (id) DO NOTHING;
+        """)
+        
+        # Denormalized per-district summary served by /district/{id}/current
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS district_latest (
+                district_id INT PRIMARY KEY REFERENCES districts(id) ON DELETE CASCADE,
+                state_name TEXT NOT NULL,
+                district_name TEXT NOT NULL,
+                state_code TEXT,
+                district_code TEXT,
+                latest_year INT,
+                latest_month INT,
+                metrics JSONB NOT NULL DEFAULT '[]',
+                state_averages JSONB,
+                snapshot_date TIMESTAMP WITH TIME ZONE,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+            );
         """)
         
         cur.execute("""
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_state_avg_lookup 
-            ON state_monthly_averages (state_name, year, month);
+            CREATE INDEX IF NOT EXISTS idx_district_latest_state
+            ON district_latest (state_name);
         """)
         
+        # Build the summary once for existing data
+        cur.execute("""
+            SELECT NOT EXISTS (SELECT 1 FROM district_latest)
+               AND EXISTS (SELECT 1 FROM mgnrega_monthly)
+        """)
+        if cur.fetchone()[0]:
+            refresh_district_latest(cur)
+        
         conn.commit()
         cur.close()
     except Exception as e:
@@ -121,3 +432,370 @@ def init_db():
     finally:
         return_db(conn)
 
+MGNREGA_MONTHLY_COLUMNS = (
+    "id", "state_name", "district_name", "state_code", "district_code",
+    "year", "month", "persondays", "total_households_worked",
+    "avg_days_per_household", "wages_lakhs", "women_persondays",
+    "women_percentage", "snapshot_date", "district_id", "content_hash",
+)
+
+def _create_mgnrega_monthly(cur):
+    # Unique keys on a partitioned table must include the partition key
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS mgnrega_monthly (
+            id SERIAL,
+            state_name TEXT NOT NULL,
+            district_name TEXT NOT NULL,
+            state_code TEXT,
+            district_code TEXT,
+            year INT NOT NULL,
+            month INT NOT NULL,
+            persondays NUMERIC DEFAULT 0,
+            total_households_worked INT DEFAULT 0,
+            avg_days_per_household NUMERIC DEFAULT 0,
+            wages_lakhs NUMERIC DEFAULT 0,
+            women_persondays NUMERIC DEFAULT 0,
+            women_percentage NUMERIC DEFAULT 0,
+            snapshot_date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            district_id INT REFERENCES districts(id) ON DELETE SET NULL,
+            content_hash TEXT,
+            PRIMARY KEY (id, year),
+            UNIQUE(state_name, district_name, year, month)
+        ) PARTITION BY RANGE (year);
+    """)
+
+def _create_mgnrega_raw(cur):
+    # One row per district-month, so a merge rewrites only the records that
+    # changed. The low toast_tuple_target gets the ~1-2 KB records
+    # compressed, which the default (about 2 KB) would mostly skip
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS mgnrega_raw (
+            state_name TEXT NOT NULL,
+            district_name TEXT NOT NULL,
+            year INT NOT NULL,
+            month INT NOT NULL,
+            payload JSONB NOT NULL,
+            fetched_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (state_name, district_name, year, month)
+        ) WITH (toast_tuple_target = 128);
+    """)
+
+def mgnrega_partition_name(year: int) -> str:
+    return f"mgnrega_monthly_y{int(year)}"
+
+def ensure_mgnrega_partitions(cur, years: Iterable[int]) -> List[int]:
+    """
+    Create the mgnrega_monthly partitions missing for `years`; returns the
+    years that were created.
+
+    Partitions are created standalone and then attached, which only takes
+    a SHARE UPDATE EXCLUSIVE lock on mgnrega_monthly, so API reads and other
+    writers are not blocked while an ingestion transaction is open. An
+    advisory lock serializes concurrent ingestion runs.
+    """
+    years = sorted({int(year) for year in years})
+    if not years:
+        return []
+    
+    def missing():
+        cur.execute("""
+            SELECT year FROM unnest(%s::int[], %s::text[]) AS p(year, name)
+            WHERE to_regclass(name) IS NULL
+        """, (years, [mgnrega_partition_name(year) for year in years]))
+        return [row[0] for row in cur.fetchall()]
+    
+    if not missing():
+        return []
+    
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('mgnrega_monthly_partitions'))")
+    created = missing()
+    for year in created:
+        name = mgnrega_partition_name(year)
+        cur.execute(f"CREATE TABLE {name} (LIKE mgnrega_monthly INCLUDING DEFAULTS)")
+        cur.execute(f"""
+            ALTER TABLE mgnrega_monthly ATTACH PARTITION {name}
+            FOR VALUES FROM ({year}) TO ({year + 1})
+        """)
+    return created
+
+def migrate_mgnrega_to_partitions(cur):
+    """
+    Move an unpartitioned mgnrega_monthly into the year-partitioned layout.
+
+    The old table is renamed aside, stripped of its constraints and indexes
+    so their names can be reused, copied into a new partitioned table and
+    dropped. Runs inside the caller's transaction.
+    """
+    cur.execute("ALTER TABLE mgnrega_monthly RENAME TO mgnrega_monthly_unpartitioned")
+    cur.execute("""
+        SELECT pg_get_serial_sequence('mgnrega_monthly_unpartitioned', 'id')
+    """)
+    sequence = cur.fetchone()[0]
+    if sequence:
+        cur.execute(f"ALTER SEQUENCE {sequence} RENAME TO mgnrega_monthly_unpartitioned_id_seq")
+    
+    cur.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'mgnrega_monthly_unpartitioned'::regclass
+          AND contype IN ('p', 'u')
+    """)
+    for (name,) in cur.fetchall():
+        cur.execute(f'ALTER TABLE mgnrega_monthly_unpartitioned DROP CONSTRAINT "{name}"')
+    cur.execute("""
+        SELECT indexrelid::regclass::text FROM pg_index
+        WHERE indrelid = 'mgnrega_monthly_unpartitioned'::regclass
+    """)
+    for (name,) in cur.fetchall():
+        cur.execute(f"DROP INDEX {name}")
+    
+    _create_mgnrega_monthly(cur)
+    cur.execute("SELECT DISTINCT year FROM mgnrega_monthly_unpartitioned")
+    ensure_mgnrega_partitions(cur, [row[0] for row in cur.fetchall()])
+    
+    columns = ", ".join(MGNREGA_MONTHLY_COLUMNS)
+    cur.execute(f"""
+        INSERT INTO mgnrega_monthly ({columns})
+        SELECT {columns} FROM mgnrega_monthly_unpartitioned
+    """)
+    cur.execute("""
+        SELECT setval(pg_get_serial_sequence('mgnrega_monthly', 'id'),
+                      COALESCE(MAX(id), 0) + 1, false)
+        FROM mgnrega_monthly
+    """)
+    cur.execute("DROP TABLE mgnrega_monthly_unpartitioned")
+
+def offload_raw_payloads(cur):
+    """
+    Move mgnrega_monthly.raw into mgnrega_raw and drop the column.
+
+    Existing rows only shrink on disk once rewritten (the partitioning
+    migration does this; otherwise run VACUUM FULL on the partitions).
+    """
+    cur.execute("""
+        INSERT INTO mgnrega_raw (state_name, district_name, year, month, payload, fetched_at)
+        SELECT state_name, district_name, year, month, raw, snapshot_date
+        FROM mgnrega_monthly
+        WHERE raw IS NOT NULL
+        ON CONFLICT (state_name, district_name, year, month) DO NOTHING
+    """)
+    cur.execute("ALTER TABLE mgnrega_monthly DROP COLUMN raw")
+
+def split_raw_archive(cur):
+    """
+    Move an mgnrega_raw holding one {district_name: record} map per
+    state-month into the per-district layout. Runs inside the caller's
+    transaction.
+    """
+    cur.execute("ALTER TABLE mgnrega_raw RENAME TO mgnrega_raw_by_month")
+    cur.execute("""
+        ALTER TABLE mgnrega_raw_by_month
+        RENAME CONSTRAINT mgnrega_raw_pkey TO mgnrega_raw_by_month_pkey
+    """)
+    _create_mgnrega_raw(cur)
+    cur.execute("""
+        INSERT INTO mgnrega_raw (state_name, district_name, year, month, payload, fetched_at)
+        SELECT m.state_name, p.key, m.year, m.month, p.value, m.fetched_at
+        FROM mgnrega_raw_by_month m, jsonb_each(m.payloads) p
+    """)
+    cur.execute("DROP TABLE mgnrega_raw_by_month")
+
+def refresh_district_geometries(cur, district_ids: Optional[Iterable[int]] = None):
+    """
+    Recompute the simplified tile geometries from `geom` for the given
+    districts, or for every district when `district_ids` is None.
+    """
+    simplified = ",\n".join(
+        f"{column} = ST_Multi(ST_SimplifyPreserveTopology("
+        f"ST_Transform(geom, 3857), {tile_tolerance(zoom)}))"
+        for zoom, column in DISTRICT_TILE_LEVELS
+    )
+    district_filter, params = "TRUE", ()
+    if district_ids is not None:
+        district_filter, params = "id = ANY(%s)", (list(district_ids),)
+    
+    cur.execute(f"""
+        UPDATE districts
+        SET {simplified}
+        WHERE geom IS NOT NULL AND {district_filter}
+    """, params)
+
+def mark_boundaries_updated(cur):
+    """
+    Record that district rows or boundaries changed, so the API drops its
+    cached tiles, district lists and point-in-polygon index. Call in the
+    transaction that changed them.
+    """
+    cur.execute("""
+        INSERT INTO snapshot_metadata (id, boundaries_updated_at)
+        VALUES (1, clock_timestamp())
+        ON CONFLICT (id) DO UPDATE SET
+            boundaries_updated_at = GREATEST(
+                snapshot_metadata.boundaries_updated_at, EXCLUDED.boundaries_updated_at
+            )
+    """)
+
+def backfill_district_ids(cur) -> int:
+    """
+    Resolve mgnrega_monthly.district_id for rows that do not have one yet.
+
+    Run after districts are loaded; when a name pair appears more than once
+    in districts the lowest id wins. Returns the number of rows updated.
+    """
+    cur.execute("""
+        UPDATE mgnrega_monthly m
+        SET district_id = d.id
+        FROM (
+            SELECT DISTINCT ON (state_name, district_name) id, state_name, district_name
+            FROM districts
+            ORDER BY state_name, district_name, id
+        ) d
+        WHERE m.district_id IS NULL
+          AND m.state_name = d.state_name
+          AND m.district_name = d.district_name
+    """)
+    return cur.rowcount
+
+def refresh_state_monthly_averages(cur, periods: Optional[Iterable[Tuple[str, int, int]]] = None):
+    """
+    Recompute state_monthly_averages for the given (state_name, year, month)
+    periods from mgnrega_monthly, or for every period when `periods` is None.
+    """
+    if periods is None:
+        period_filter = "TRUE"
+        params: tuple = ()
+    else:
+        periods = sorted(set(periods))
+        if not periods:
+            return
+        # The literal year list lets the planner prune partitions
+        period_filter = """
+            year = ANY(%s::int[])
+            AND (state_name, year, month) IN (
+                SELECT * FROM unnest(%s::text[], %s::int[], %s::int[])
+            )
+        """
+        params = (sorted({year for _, year, _ in periods}),) + tuple(
+            list(column) for column in zip(*periods)
+        )
+    
+    cur.execute(f"""
+        INSERT INTO state_monthly_averages (
+            state_name, year, month, district_count,
+            sum_persondays, sum_households, sum_days_per_household,
+            sum_wages, sum_women_pct, snapshot_date
+        )
+        SELECT state_name, year, month, COUNT(*),
+               COALESCE(SUM(persondays), 0),
+               COALESCE(SUM(total_households_worked), 0),
+               COALESCE(SUM(avg_days_per_household), 0),
+               COALESCE(SUM(wages_lakhs), 0),
+               COALESCE(SUM(women_percentage), 0),
+               MAX(snapshot_date)
+        FROM mgnrega_monthly
+        WHERE {period_filter}
+        GROUP BY state_name, year, month
+        ON CONFLICT (state_name, year, month) DO UPDATE SET
+            district_count = EXCLUDED.district_count,
+            sum_persondays = EXCLUDED.sum_persondays,
+            sum_households = EXCLUDED.sum_households,
+            sum_days_per_household = EXCLUDED.sum_days_per_household,
+            sum_wages = EXCLUDED.sum_wages,
+            sum_women_pct = EXCLUDED.sum_women_pct,
+            snapshot_date = EXCLUDED.snapshot_date
+    """, params)
+
+STATE_AVERAGES_JSON = """
+    jsonb_build_object(
+        'avg_persondays', sa.avg_persondays,
+        'avg_households', sa.avg_households,
+        'avg_days_per_household', sa.avg_days_per_household,
+        'avg_wages', sa.avg_wages,
+        'avg_women_pct', sa.avg_women_pct
+    )
+"""
+
+def refresh_district_latest(cur, districts: Optional[Iterable[Tuple[str, str]]] = None):
+    """
+    Rebuild district_latest rows for the given (state_name, district_name)
+    pairs, or for every district when `districts` is None.
+
+    State averages change whenever any district of a state changes, so they
+    are also refreshed for the untouched districts of the affected states.
+    """
+    if districts is None:
+        district_filter = "TRUE"
+        params: dict = {"months": DISTRICT_LATEST_MONTHS}
+    else:
+        pairs = sorted(set(districts))
+        if not pairs:
+            return
+        district_filter = """
+            (d.state_name, d.district_name) IN (
+                SELECT * FROM unnest(%(states)s::text[], %(districts)s::text[])
+            )
+        """
+        params = {
+            "months": DISTRICT_LATEST_MONTHS,
+            "states": [state for state, _ in pairs],
+            "districts": [district for _, district in pairs],
+        }
+    
+    cur.execute(f"""
+        INSERT INTO district_latest (
+            district_id, state_name, district_name, state_code, district_code,
+            latest_year, latest_month, metrics, state_averages, snapshot_date,
+            updated_at
+        )
+        SELECT d.id, d.state_name, d.district_name, d.state_code, d.district_code,
+               m.latest_year, m.latest_month, m.metrics,
+               CASE WHEN sa.state_name IS NULL THEN NULL ELSE {STATE_AVERAGES_JSON} END,
+               m.snapshot_date, now()
+        FROM districts d
+        CROSS JOIN LATERAL (
+            SELECT jsonb_agg(to_jsonb(r) ORDER BY r.year DESC, r.month DESC) AS metrics,
+                   (array_agg(r.year ORDER BY r.year DESC, r.month DESC))[1] AS latest_year,
+                   (array_agg(r.month ORDER BY r.year DESC, r.month DESC))[1] AS latest_month,
+                   MAX(r.snapshot_date) AS snapshot_date
+            FROM (
+                SELECT d.state_name, d.district_name, year, month,
+                       persondays, total_households_worked, avg_days_per_household,
+                       wages_lakhs, women_persondays, women_percentage, snapshot_date
+                FROM mgnrega_monthly mm
+                WHERE mm.district_id = d.id
+                ORDER BY year DESC, month DESC
+                LIMIT %(months)s
+            ) r
+        ) m
+        LEFT JOIN state_monthly_averages sa
+            ON sa.state_name = d.state_name
+           AND sa.year = m.latest_year
+           AND sa.month = m.latest_month
+        WHERE m.metrics IS NOT NULL AND {district_filter}
+        ON CONFLICT (district_id) DO UPDATE SET
+            state_name = EXCLUDED.state_name,
+            district_name = EXCLUDED.district_name,
+            state_code = EXCLUDED.state_code,
+            district_code = EXCLUDED.district_code,
+            latest_year = EXCLUDED.latest_year,
+            latest_month = EXCLUDED.latest_month,
+            metrics = EXCLUDED.metrics,
+            state_averages = EXCLUDED.state_averages,
+            snapshot_date = EXCLUDED.snapshot_date,
+            updated_at = now()
+    """, params)
+    
+    if districts is None:
+        return
+    
+    cur.execute(f"""
+        UPDATE district_latest dl
+        SET state_averages = {STATE_AVERAGES_JSON},
+            updated_at = now()
+        FROM state_monthly_averages sa
+        WHERE dl.state_name = ANY(%(states)s)
+          AND sa.state_name = dl.state_name
+          AND sa.year = dl.latest_year
+          AND sa.month = dl.latest_month
+          AND dl.state_averages IS DISTINCT FROM {STATE_AVERAGES_JSON}
+    """, {"states": sorted({state for state, _ in pairs})})
+
@@ -0,0 +1,64 @@
+"""
+Conditional GET support (ETag / Last-Modified) derived from the data snapshot
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict
+from fastapi import Request
+
+# Clients may reuse a response only after revalidating it with us
+CACHE_CONTROL = "public, no-cache"
+
+def make_etag(version: datetime, request: Request) -> str:
+    """Strong ETag for the requested resource at the given snapshot version"""
+    query = "&".join(sorted(
+        f"{key}={value}" for key, value in request.query_params.multi_items()
+    ))
+    digest = hashlib.sha1(
+        f"{version.isoformat()}|{request.url.path}|{query}".encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def validator_headers(version: datetime, request: Request) -> Dict[str, str]:
+    return {
+        "ETag": make_etag(version, request),
+        "Last-Modified": http_date(version),
+        "Cache-Control": CACHE_CONTROL,
+    }
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Strong comparison: weak validators never match
+    return any(tag.strip() == etag for tag in header.split(","))
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since for a GET request.
+
+    If-Modified-Since is ignored when If-None-Match is present (RFC 9110).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
@@ -2,21 +2,38 @@
 Data ingestion script for data.gov.in
 """
 import os
+import io
 import time
 import json
+import hashlib
 import logging
+import threading
 import requests
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
 import psycopg2
-from psycopg2.extras import execute_values
+import psycopg2.extras
+from app.db import (
+    ensure_mgnrega_partitions, refresh_district_latest, refresh_state_monthly_averages
+)
+from app.tracing import TracingConnection, statement_scope
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATAGOV_KEY = os.getenv("DATAGOV_KEY", "")
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://app:secret@db:5432/app")
-BASE_URL = "https://api.data.gov.in/resource"
+# Point at a local stand-in (scripts/mock_datagov_server.py) for testing
+BASE_URL = os.getenv("DATAGOV_BASE_URL", "https://api.data.gov.in/resource").rstrip("/")
+
+def connect():
+    """Open a worker connection whose statements are timed and traced"""
+    return psycopg2.connect(DATABASE_URL, connection_factory=TracingConnection)
 
 # You'll need to replace RESOURCE_ID with actual resource ID from data.gov.in
 RESOURCE_ID = os.getenv("DATAGOV_RESOURCE_ID", "")
@@ -32,21 +49,128 @@ def exponential_backoff(max_retries=5, base_delay=1):
                     if attempt == max_retries - 1:
                         raise
                     
+                    limiter = kwargs.get("limiter")
                     if isinstance(e.response, requests.Response):
                         if e.response.status_code == 429:
-                            retry_after = int(e.response.headers.get("Retry-After", base_delay * (2 ** attempt)))
+                            # Still throttled after fetch_page's own pauses;
+                            # wait through the shared bucket like it does
+                            retry_after = retry_after_seconds(e.response, base_delay * (2 ** attempt))
                             logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
-                            time.sleep(retry_after)
+                            if limiter:
+                                limiter.pause(retry_after)
+                            else:
+                                time.sleep(retry_after)
                             continue
                     
                     delay = base_delay * (2 ** attempt)
                     logger.warning(f"Request failed (attempt {attempt + 1}/{max_retries}). Retrying in {delay}s...")
+                    if limiter:
+                        limiter.record_retry(delay)
                     time.sleep(delay)
         return wrapper
     return decorator
 
+PAGE_SIZE = 500
+# Pages fetched ahead of the one being stored, and the request rate the
+# data.gov.in key is allowed (shared by all fetch threads)
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+DATAGOV_RATE_PER_SEC = float(os.getenv("DATAGOV_RATE_PER_SEC", "2"))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by the fetch threads.
+
+    `pause()` blocks every caller until the given time has passed, which is
+    how a Retry-After from one thread throttles all of them. Being shared
+    by a run's fetches, it also counts the time they lost to throttling,
+    rate limiting and retries (see `stats()`).
+    """
+
+    def __init__(self, rate: float = DATAGOV_RATE_PER_SEC, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.rate_limited = 0
+        self.rate_limited_pause = 0.0
+        self.retries = 0
+        self.retry_delay = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate
+                    )
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self.rate_limited += 1
+            self.rate_limited_pause += seconds
+
+    def record_retry(self, delay: float):
+        with self._lock:
+            self.retries += 1
+            self.retry_delay += delay
+
+    def stats(self) -> Dict:
+        """
+        429 responses and the pauses they asked for, failed requests retried
+        and their backoff, and the time fetch threads spent waiting in
+        `acquire()` (summed over threads, so it can exceed wall time)
+        """
+        with self._lock:
+            return {
+                "rate_limited": self.rate_limited,
+                "rate_limited_pause_s": round(self.rate_limited_pause, 3),
+                "retries": self.retries,
+                "retry_delay_s": round(self.retry_delay, 3),
+                "throttle_wait_s": round(self.waited, 3),
+            }
+
+_session_local = threading.local()
+
+def get_session() -> requests.Session:
+    """Per-thread keep-alive session (requests.Session is not thread-safe)"""
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _session_local.session = session
+    return session
+
+def retry_after_seconds(response: requests.Response, default: float) -> float:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return default
+
 @exponential_backoff(max_retries=5)
-def fetch_page(params: Dict, page: int = 1, per_page: int = 500) -> Optional[Dict]:
+def fetch_page(params: Dict, page: int = 1, per_page: int = PAGE_SIZE,
+               limiter: Optional[TokenBucket] = None,
+               max_rate_limited: int = 5) -> Optional[Dict]:
     """Fetch a page of data from data.gov.in"""
     if not DATAGOV_KEY:
         logger.warning("DATAGOV_KEY not set. Skipping API call.")
@@ -65,120 +189,435 @@ def fetch_page(params: Dict, page: int = 1, per_page: int = 500) -> Optional[Dic
     }
     
     url = f"{BASE_URL}/{RESOURCE_ID}"
-    logger.info(f"Fetching page {page} from {url}")
-    
-    response = requests.get(url, params=params_with_pagination, timeout=30)
     
-    if response.status_code == 429:
-        retry_after = int(response.headers.get("Retry-After", 60))
-        logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
-        time.sleep(retry_after)
-        return fetch_page(params, page, per_page)
+    for _ in range(max_rate_limited):
+        if limiter:
+            limiter.acquire()
+        logger.info(f"Fetching page {page} from {url}")
+        response = get_session().get(url, params=params_with_pagination, timeout=30)
+        
+        if response.status_code != 429:
+            break
+        
+        retry_after = retry_after_seconds(response, 60)
+        logger.warning(f"Rate limited on page {page}. Pausing all fetches for {retry_after}s...")
+        if limiter:
+            limiter.pause(retry_after)
+        else:
+            time.sleep(retry_after)
     
     response.raise_for_status()
     return response.json()
 
-def normalize_record(record: Dict) -> Optional[Dict]:
-    """Normalize a record from data.gov.in to our schema"""
+def iter_pages(params: Dict, per_page: int = PAGE_SIZE,
+               concurrency: int = INGEST_CONCURRENCY,
+               limiter: Optional[TokenBucket] = None,
+               start_page: int = 1) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield (page, data) in page order while later pages are fetched ahead.
+
+    Up to `concurrency` pages are in flight at once, so the caller's
+    normalization and storage overlap with the network. Iteration stops at
+    the first empty or short page (or at the API's reported total).
+    """
+    limiter = limiter or TokenBucket()
+    last_page: Optional[int] = None
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch") as pool:
+        in_flight = {}
+        next_page = start_page
+        
+        def submit_ahead(limit: int = concurrency):
+            nonlocal next_page
+            while len(in_flight) < limit and (last_page is None or next_page <= last_page):
+                in_flight[next_page] = pool.submit(
+                    fetch_page, params, next_page, per_page, limiter=limiter
+                )
+                next_page += 1
+        
+        page = start_page
+        try:
+            # The first page alone: its reported total bounds the read-ahead
+            submit_ahead(limit=1)
+            while page in in_flight:
+                data = in_flight.pop(page).result()
+                
+                if not data:
+                    logger.warning("No data returned from API")
+                    return
+                
+                records = data.get("records", [])
+                if last_page is None and data.get("total") is not None:
+                    try:
+                        last_page = max(1, -(-int(data["total"]) // per_page))
+                    except (TypeError, ValueError):
+                        pass
+                
+                yield page, data
+                
+                if not records or len(records) < per_page:
+                    return
+                
+                page += 1
+                submit_ahead()
+        finally:
+            for future in in_flight.values():
+                future.cancel()
+
+# Archive each source record in mgnrega_raw; disable to skip the archive
+STORE_RAW_PAYLOADS = os.getenv("STORE_RAW_PAYLOADS", "true").lower() in ("1", "true", "yes")
+
+# Reused so each record skips building a new encoder
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=str)
+
+def canonical_json(record: Dict) -> str:
+    return _canonical_encoder.encode(record)
+
+def content_hash(record: Dict) -> str:
+    """Stable digest of a source record; equal hashes mean nothing changed"""
+    return hashlib.md5(canonical_json(record).encode("utf-8")).hexdigest()
+
+# Source fields tried for each normalized field, first non-empty wins.
+# Adjust these to the field names of the data.gov.in resource in use.
+FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "state_name": ("state_name", "state"),
+    "district_name": ("district_name", "district"),
+    "state_code": ("state_code",),
+    "district_code": ("district_code",),
+    "year": ("year", "financial_year"),
+    "month": ("month",),
+    "persondays": ("persondays", "person_days"),
+    "total_households_worked": ("total_households_worked", "households"),
+    "avg_days_per_household": (
+        "avg_days_per_household", "average_days_of_employment_provided_per_household"
+    ),
+    "wages_lakhs": ("wages_lakhs", "total_exp_rs__in_lakhs__", "wages_disbursed"),
+    "women_persondays": ("women_persondays", "women_person_days"),
+}
+TEXT_FIELDS = ("state_name", "district_name", "state_code", "district_code")
+INT_FIELDS = ("year", "month", "total_households_worked")
+FLOAT_FIELDS = ("persondays", "avg_days_per_household", "wages_lakhs", "women_persondays")
+# INT_FIELDS are stored in Postgres INT columns
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+@lru_cache(maxsize=64)
+def resolve_schema(keys: frozenset) -> Dict[str, Tuple[str, ...]]:
+    """The aliases of each field that a page with these keys actually has"""
+    return {
+        field: tuple(alias for alias in aliases if alias in keys)
+        for field, aliases in FIELD_ALIASES.items()
+    }
+
+def _column(records: List[Dict], aliases: Tuple[str, ...]) -> list:
+    if not aliases:
+        return [None] * len(records)
+    values = [record.get(aliases[0]) for record in records]
+    for alias in aliases[1:]:
+        values = [value or record.get(alias) for value, record in zip(values, records)]
+    return values
+
+def _numeric_column(values: list, default) -> Tuple[np.ndarray, List[int]]:
+    """
+    Convert a column to float64 in one pass; empty values become `default`.
+    Returns the array and the indexes of values that are not finite numbers.
+    """
+    column = np.array(values, dtype=object)
+    column[np.logical_not(column.astype(bool))] = default
     try:
-        # Map fields - adjust these based on actual data.gov.in field names
-        # This is a template - you'll need to adjust field mappings based on actual API response
+        converted = column.astype(np.float64)
+    except (TypeError, ValueError):
+        # Only pages with bad values pay for element-wise conversion
+        converted = np.full(len(column), np.nan)
+        for i, value in enumerate(column):
+            try:
+                converted[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+    return converted, np.flatnonzero(~np.isfinite(converted)).tolist()
+
+def normalize_page(records: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Normalize a page of data.gov.in records to our schema column by column.
+
+    Field aliases are resolved once per distinct page schema and numeric
+    columns are converted as arrays. Returns the normalized rows and a
+    report of rejected rows (index in the page, reason, source record).
+    """
+    if not records:
+        return [], []
+    
+    schema = resolve_schema(frozenset().union(*records))
+    reasons: Dict[int, str] = {}
+    columns: Dict[str, list] = {
+        field: _column(records, schema[field]) for field in TEXT_FIELDS
+    }
+    for i, (state, district) in enumerate(zip(columns["state_name"], columns["district_name"])):
+        if not state or not district:
+            reasons[i] = "missing state or district name"
+    
+    numeric: Dict[str, np.ndarray] = {}
+    defaults = {"year": datetime.now().year, "month": 1}
+    for field in INT_FIELDS + FLOAT_FIELDS:
+        values, bad = _numeric_column(_column(records, schema[field]), defaults.get(field, 0))
+        for i in bad:
+            reasons.setdefault(i, f"{field} is not a number")
+        if field in INT_FIELDS:
+            with np.errstate(invalid="ignore"):
+                for i in np.flatnonzero(values != np.trunc(values)).tolist():
+                    reasons.setdefault(i, f"{field} is not a whole number")
+                for i in np.flatnonzero((values < INT_MIN) | (values > INT_MAX)).tolist():
+                    reasons.setdefault(i, f"{field} is out of range")
+        numeric[field] = values
+    for i in np.flatnonzero((numeric["month"] < 1) | (numeric["month"] > 12)).tolist():
+        reasons.setdefault(i, "month is not between 1 and 12")
+    
+    for field in INT_FIELDS:
+        columns[field] = np.nan_to_num(numeric[field]).astype(np.int64).tolist()
+    for field in FLOAT_FIELDS:
+        columns[field] = numeric[field].tolist()
+    
+    persondays, women = numeric["persondays"], numeric["women_persondays"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        columns["women_percentage"] = np.where(
+            persondays > 0, women / persondays * 100, 0.0
+        ).tolist()
+    
+    # One canonical serialization serves as both the hash input and the
+    # archived payload
+    canonical = [canonical_json(record) for record in records]
+    columns["raw"] = canonical if STORE_RAW_PAYLOADS else [None] * len(records)
+    columns["content_hash"] = [
+        hashlib.md5(text.encode("utf-8")).hexdigest() for text in canonical
+    ]
+    
+    names = list(columns)
+    rows = [
+        dict(zip(names, values))
+        for i, values in enumerate(zip(*columns.values()))
+        if i not in reasons
+    ]
+    rejected = [
+        {"index": i, "reason": reason, "record": records[i]}
+        for i, reason in sorted(reasons.items())
+    ]
+    return rows, rejected
+
+def normalize_record(record: Dict) -> Optional[Dict]:
+    """Normalize a single record; None if it is rejected"""
+    rows, rejected = normalize_page([record])
+    if rejected:
+        logger.warning(f"Rejected record: {rejected[0]['reason']}")
+    return rows[0] if rows else None
+
+# Columns staged for each normalized record, in COPY order
+STAGING_COLUMNS = (
+    "state_name", "district_name", "state_code", "district_code",
+    "year", "month", "persondays", "total_households_worked",
+    "avg_days_per_household", "wages_lakhs", "women_persondays",
+    "women_percentage", "raw", "content_hash",
+)
+# Staged columns that go to mgnrega_monthly; raw goes to mgnrega_raw
+METRIC_COLUMNS = tuple(column for column in STAGING_COLUMNS if column != "raw")
+
+def _copy_value(value) -> str:
+    """Encode a value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+# Staged pages merged (and checkpointed) at a time
+CHECKPOINT_PAGES = int(os.getenv("INGEST_CHECKPOINT_PAGES", "20"))
+# Months before the watermark re-fetched on incremental runs to pick up revisions
+INGEST_LOOKBACK_MONTHS = int(os.getenv("INGEST_LOOKBACK_MONTHS", "2"))
+# data.gov.in field used to request one year at a time on incremental runs;
+# empty disables server-side filtering (records are still skipped locally)
+DATAGOV_YEAR_FILTER = os.getenv("DATAGOV_YEAR_FILTER", "year")
+
+class BulkLoader:
+    """
+    Stages normalized records with COPY and merges them into
+    mgnrega_monthly with a single upsert, all on one connection.
+
+    The staging table is a session-local temporary table (never WAL-logged)
+    emptied at commit, so nothing reaches mgnrega_monthly until `merge()`
+    runs and the caller commits.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.staged = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS mgnrega_staging (
+                seq BIGSERIAL,
+                state_name TEXT,
+                district_name TEXT,
+                state_code TEXT,
+                district_code TEXT,
+                year INT,
+                month INT,
+                persondays NUMERIC,
+                total_households_worked INT,
+                avg_days_per_household NUMERIC,
+                wages_lakhs NUMERIC,
+                women_persondays NUMERIC,
+                women_percentage NUMERIC,
+                raw JSONB,
+                content_hash TEXT,
+                district_id INT
+            ) ON COMMIT DELETE ROWS
+        """)
+        cur.close()
+
+    def stage(self, records: List[Dict]):
+        """Append records to the staging table with COPY"""
+        if not records:
+            return
         
-        year = int(record.get("year") or record.get("financial_year") or datetime.now().year)
-        month = int(record.get("month") or 1)
+        buf = io.StringIO()
+        for rec in records:
+            buf.write("\t".join(_copy_value(rec.get(column)) for column in STAGING_COLUMNS))
+            buf.write("\n")
+        buf.seek(0)
         
-        persondays = float(record.get("persondays") or record.get("person_days") or 0)
-        households = int(record.get("total_households_worked") or record.get("households") or 0)
+        cur = self.conn.cursor()
+        cur.copy_expert(
+            f"COPY mgnrega_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+            buf
+        )
+        cur.close()
+        self.staged += len(records)
+
+    @statement_scope("bulk_merge")
+    def merge(self) -> int:
+        """
+        Upsert everything staged into mgnrega_monthly; returns rows written.
+
+        Source payloads of written rows are archived in mgnrega_raw. Rows
+        whose content hash is unchanged are left untouched (no new row
+        version in either table). Per-merge counts accumulate in
+        `inserted`, `updated` and `unchanged`.
+        """
+        if not self.staged:
+            return 0
         
-        avg_days = float(record.get("avg_days_per_household") or 
-                        record.get("average_days_of_employment_provided_per_household") or 0)
+        cur = self.conn.cursor()
         
-        wages = float(record.get("wages_lakhs") or 
-                     record.get("total_exp_rs__in_lakhs__") or 
-                     record.get("wages_disbursed") or 0)
+        # Resolve the surrogate district key for the whole run at once
+        cur.execute("""
+            UPDATE mgnrega_staging s
+            SET district_id = d.id
+            FROM (
+                SELECT DISTINCT ON (state_name, district_name) id, state_name, district_name
+                FROM districts
+                ORDER BY state_name, district_name, id
+            ) d
+            WHERE s.state_name = d.state_name AND s.district_name = d.district_name
+        """)
         
-        women_persondays = float(record.get("women_persondays") or 
-                                record.get("women_person_days") or 0)
+        # Rows for a year without a partition would be rejected
+        cur.execute("SELECT DISTINCT year FROM mgnrega_staging")
+        created = ensure_mgnrega_partitions(cur, [row[0] for row in cur.fetchall()])
+        if created:
+            logger.info(f"Created mgnrega_monthly partitions for {created}")
         
-        # Calculate women percentage
-        women_pct = (women_persondays / persondays * 100) if persondays > 0 else 0
+        # The last staged version of a row wins; ON CONFLICT cannot touch
+        # the same row twice in one statement. Partitioned tables cannot
+        # return xmax, so inserts and updates are told apart by the keys that
+        # existed in the statement's snapshot.
+        cur.execute(f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (state_name, district_name, year, month)
+                    {', '.join(STAGING_COLUMNS)}, district_id
+                FROM mgnrega_staging
+                ORDER BY state_name, district_name, year, month, seq DESC
+            ),
+            existing AS (
+                SELECT l.state_name, l.district_name, l.year, l.month
+                FROM latest l
+                JOIN mgnrega_monthly m USING (state_name, district_name, year, month)
+            ),
+            written AS (
+                INSERT INTO mgnrega_monthly (
+                    {', '.join(METRIC_COLUMNS)}, district_id
+                )
+                SELECT {', '.join(METRIC_COLUMNS)}, district_id FROM latest
+                ON CONFLICT (state_name, district_name, year, month)
+                DO UPDATE SET
+                    persondays = EXCLUDED.persondays,
+                    total_households_worked = EXCLUDED.total_households_worked,
+                    avg_days_per_household = EXCLUDED.avg_days_per_household,
+                    wages_lakhs = EXCLUDED.wages_lakhs,
+                    women_persondays = EXCLUDED.women_persondays,
+                    women_percentage = EXCLUDED.women_percentage,
+                    content_hash = EXCLUDED.content_hash,
+                    district_id = COALESCE(EXCLUDED.district_id, mgnrega_monthly.district_id),
+                    snapshot_date = now()
+                WHERE mgnrega_monthly.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                   OR (mgnrega_monthly.district_id IS NULL AND EXCLUDED.district_id IS NOT NULL)
+                RETURNING state_name, district_name, year, month
+            ),
+            archived AS (
+                INSERT INTO mgnrega_raw (state_name, district_name, year, month, payload)
+                SELECT l.state_name, l.district_name, l.year, l.month, l.raw
+                FROM latest l
+                JOIN written w USING (state_name, district_name, year, month)
+                WHERE l.raw IS NOT NULL
+                ON CONFLICT (state_name, district_name, year, month) DO UPDATE SET
+                    payload = EXCLUDED.payload,
+                    fetched_at = now()
+            )
+            SELECT (SELECT COUNT(*) FROM latest),
+                   COUNT(*) FILTER (WHERE e.state_name IS NULL),
+                   COUNT(*) FILTER (WHERE e.state_name IS NOT NULL)
+            FROM written w
+            LEFT JOIN existing e USING (state_name, district_name, year, month)
+        """)
+        distinct, inserted, updated = cur.fetchone()
+        self.inserted += inserted
+        self.updated += updated
+        self.unchanged += distinct - inserted - updated
         
+        # The snapshot version is not advanced here: the API keys its caches
+        # and ETags on it, so it only moves once the derived tables are
+        # rebuilt (update_snapshot_metadata)
+        cur.execute("TRUNCATE mgnrega_staging")
+        cur.close()
+        self.staged = 0
+        return inserted + updated
+
+    def counts(self) -> Dict[str, int]:
         return {
-            "state_name": record.get("state_name") or record.get("state"),
-            "district_name": record.get("district_name") or record.get("district"),
-            "state_code": record.get("state_code"),
-            "district_code": record.get("district_code"),
-            "year": year,
-            "month": month,
-            "persondays": persondays,
-            "total_households_worked": households,
-            "avg_days_per_household": avg_days,
-            "wages_lakhs": wages,
-            "women_persondays": women_persondays,
-            "women_percentage": women_pct,
-            "raw": json.dumps(record)
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
         }
-    except Exception as e:
-        logger.error(f"Error normalizing record: {e}")
-        logger.error(f"Record: {record}")
-        return None
 
 def store_records(records: List[Dict]):
     """Store normalized records in database"""
     if not records:
         return
     
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = connect()
     try:
-        cur = conn.cursor()
-        
-        # Prepare data for upsert
-        insert_data = []
-        for rec in records:
-            insert_data.append((
-                rec["state_name"],
-                rec["district_name"],
-                rec.get("state_code"),
-                rec.get("district_code"),
-                rec["year"],
-                rec["month"],
-                rec["persondays"],
-                rec["total_households_worked"],
-                rec["avg_days_per_household"],
-                rec["wages_lakhs"],
-                rec["women_persondays"],
-                rec["women_percentage"],
-                rec["raw"]
-            ))
-        
-        # Upsert using ON CONFLICT
-        execute_values(
-            cur,
-            """
-            INSERT INTO mgnrega_monthly (
-                state_name, district_name, state_code, district_code,
-                year, month, persondays, total_households_worked,
-                avg_days_per_household, wages_lakhs, women_persondays,
-                women_percentage, raw
-            )
-            VALUES %s
-            ON CONFLICT (state_name, district_name, year, month)
-            DO UPDATE SET
-                persondays = EXCLUDED.persondays,
-                total_households_worked = EXCLUDED.total_households_worked,
-                avg_days_per_household = EXCLUDED.avg_days_per_household,
-                wages_lakhs = EXCLUDED.wages_lakhs,
-                women_persondays = EXCLUDED.women_persondays,
-                women_percentage = EXCLUDED.women_percentage,
-                raw = EXCLUDED.raw,
-                snapshot_date = now()
-            """,
-            insert_data
-        )
-        
+        loader = BulkLoader(conn)
+        loader.stage(records)
+        loader.merge()
         conn.commit()
-        logger.info(f"Stored {len(records)} records")
-        cur.close()
+        counts = loader.counts()
+        logger.info(
+            f"Stored {len(records)} records ({counts['inserted']} inserted, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged)"
+        )
     except Exception as e:
         conn.rollback()
         logger.error(f"Error storing records: {e}")
@@ -186,76 +625,424 @@ def store_records(records: List[Dict]):
     finally:
         conn.close()
 
-def refresh_state_averages():
-    """Refresh materialized view for state averages"""
-    conn = psycopg2.connect(DATABASE_URL)
+@statement_scope("refresh_state_averages")
+def refresh_state_averages(periods=None):
+    """
+    Recompute state averages for the (state_name, year, month) periods a run
+    wrote, or all of them when `periods` is None.
+
+    Failures are raised: the table is maintained incrementally, so periods
+    skipped here would otherwise stay wrong until the next full rebuild.
+    """
+    conn = connect()
     try:
         cur = conn.cursor()
-        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY state_monthly_averages;")
+        refresh_state_monthly_averages(cur, periods)
         conn.commit()
-        logger.info("Refreshed state averages")
+        if periods is None:
+            logger.info("Rebuilt all state averages")
+        else:
+            logger.info(f"Refreshed state averages for {len(periods)} state-months")
         cur.close()
     except Exception as e:
+        conn.rollback()
         logger.error(f"Error refreshing averages: {e}")
+        raise
     finally:
         conn.close()
 
-def fetch_and_store(state: str = "Uttar Pradesh"):
-    """Main ingestion function"""
+@statement_scope("refresh_district_summaries")
+def refresh_district_summaries(districts):
+    """Rebuild district_latest for the (state_name, district_name) pairs a run touched"""
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        refresh_district_latest(cur, districts)
+        conn.commit()
+        logger.info(f"Refreshed latest summaries for {len(districts)} districts")
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error refreshing district summaries: {e}")
+        raise
+    finally:
+        conn.close()
+
+@statement_scope("update_snapshot_metadata")
+def update_snapshot_metadata(state: str, run_rows: int,
+                             refreshed_since: Optional[datetime] = None):
+    """
+    Record per-state row counts and refresh the global snapshot totals.
+
+    This publishes the new snapshot version (the newest row's snapshot_date)
+    to the API, so call it only after state averages and district
+    summaries have been refreshed. `refreshed_since` is the pending refresh
+    point those refreshes covered; it is cleared unless a later run has
+    moved it since.
+    """
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO state_snapshot_metadata (state_name, last_updated, row_count, last_run_rows)
+            SELECT %s, MAX(snapshot_date), COUNT(*), %s
+            FROM mgnrega_monthly
+            WHERE state_name = %s
+            ON CONFLICT (state_name) DO UPDATE SET
+                last_updated = EXCLUDED.last_updated,
+                row_count = EXCLUDED.row_count,
+                last_run_rows = EXCLUDED.last_run_rows,
+                refresh_pending_since = CASE
+                    WHEN state_snapshot_metadata.refresh_pending_since <= %s THEN NULL
+                    ELSE state_snapshot_metadata.refresh_pending_since
+                END
+        """, (state, run_rows, state, refreshed_since))
+        cur.execute("""
+            INSERT INTO snapshot_metadata (id, latest_snapshot, total_rows, updated_at)
+            SELECT 1, MAX(last_updated), COALESCE(SUM(row_count), 0), now()
+            FROM state_snapshot_metadata
+            ON CONFLICT (id) DO UPDATE SET
+                latest_snapshot = GREATEST(snapshot_metadata.latest_snapshot, EXCLUDED.latest_snapshot),
+                total_rows = EXCLUDED.total_rows,
+                updated_at = now()
+        """)
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error updating snapshot metadata: {e}")
+        raise
+    finally:
+        conn.close()
+
+@statement_scope("refresh_derived")
+def refresh_derived(state_rows: Dict[str, int]):
+    """
+    Refresh everything derived from mgnrega_monthly once after one or more
+    state runs: the state averages and district summaries touched by rows
+    written since each state's refresh became pending, and the snapshot
+    metadata.
+
+    A failed refresh raises before the snapshot metadata is touched, so
+    the API keeps serving the previous version and the pending refresh
+    point stays put for the next run to cover again.
+    """
+    written = set()
+    pending = {}
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT state_name, COALESCE(refresh_pending_since, run_started_at)
+            FROM state_snapshot_metadata
+            WHERE state_name = ANY(%s)
+              AND COALESCE(refresh_pending_since, run_started_at) IS NOT NULL
+        """, (list(state_rows),))
+        for state, since in cur.fetchall():
+            pending[state] = since
+            written |= rows_written_since(conn, state, since)
+        cur.close()
+    finally:
+        conn.close()
+    
+    # Averages first: district summaries copy them
+    refresh_state_averages({(state, year, month) for state, _, year, month in written})
+    refresh_district_summaries({(state, district) for state, district, _, _ in written})
+    for state, run_rows in state_rows.items():
+        update_snapshot_metadata(state, run_rows, pending.get(state))
+
+@statement_scope("start_run")
+def start_run(conn, state: str) -> Dict:
+    """
+    Mark a run as started and return the state's watermark and checkpoint.
+
+    An interrupted run keeps its original start time so rows it already
+    committed can be found again when it resumes; attempt_started_at is
+    always this attempt's start. The earliest start whose rows have not
+    reached the derived tables is kept in refresh_pending_since until
+    `refresh_derived` succeeds.
+    """
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute("""
+        INSERT INTO state_snapshot_metadata (state_name, run_status, run_started_at,
+                                             attempt_started_at, refresh_pending_since)
+        VALUES (%s, 'running', now(), now(), now())
+        ON CONFLICT (state_name) DO UPDATE SET
+            run_status = 'running',
+            attempt_started_at = now(),
+            run_started_at = CASE
+                WHEN state_snapshot_metadata.resume_page IS NOT NULL
+                THEN COALESCE(state_snapshot_metadata.run_started_at, now())
+                ELSE now()
+            END,
+            refresh_pending_since = COALESCE(
+                state_snapshot_metadata.refresh_pending_since,
+                CASE WHEN state_snapshot_metadata.resume_page IS NOT NULL
+                     THEN state_snapshot_metadata.run_started_at END,
+                now()
+            ),
+            last_error = NULL
+        RETURNING watermark_year, watermark_month, resume_segment, resume_page,
+                  run_started_at
+    """, (state,))
+    progress = dict(cur.fetchone())
+    conn.commit()
+    cur.close()
+    return progress
+
+@statement_scope("save_checkpoint")
+def save_checkpoint(conn, loader: "BulkLoader", state: str,
+                    segment: Optional[int], next_page: int) -> int:
+    """Merge what is staged and record where a crashed run should resume"""
+    merged = loader.merge()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE state_snapshot_metadata
+        SET resume_segment = %s, resume_page = %s
+        WHERE state_name = %s
+    """, (segment, next_page, state))
+    conn.commit()
+    cur.close()
+    logger.info(f"Checkpoint for {state}: {merged} rows merged, next page {next_page}")
+    return merged
+
+@statement_scope("finish_run")
+def finish_run(conn, state: str, status: str, error: Optional[str] = None,
+               rejected: Optional[int] = None):
+    """
+    Close a run; a completed run advances the watermark and clears the
+    checkpoint, a failed one is counted in failed_runs
+    """
+    cur = conn.cursor()
+    if status == "complete":
+        cur.execute("""
+            UPDATE state_snapshot_metadata s
+            SET watermark_year = latest.year,
+                watermark_month = latest.month,
+                resume_segment = NULL,
+                resume_page = NULL,
+                run_status = 'complete',
+                run_finished_at = now(),
+                last_run_rejected = %s
+            FROM (
+                SELECT year, month FROM mgnrega_monthly
+                WHERE state_name = %s
+                ORDER BY year DESC, month DESC
+                LIMIT 1
+            ) latest
+            WHERE s.state_name = %s
+        """, (rejected, state, state))
+        if cur.rowcount == 0:
+            cur.execute("""
+                UPDATE state_snapshot_metadata
+                SET resume_segment = NULL, resume_page = NULL,
+                    run_status = 'complete', run_finished_at = now(),
+                    last_run_rejected = %s
+                WHERE state_name = %s
+            """, (rejected, state))
+    else:
+        cur.execute("""
+            UPDATE state_snapshot_metadata
+            SET run_status = %s, run_finished_at = now(), last_error = %s,
+                last_run_rejected = %s,
+                failed_runs = failed_runs + 1
+            WHERE state_name = %s
+        """, (status, error, rejected, state))
+    conn.commit()
+    cur.close()
+
+def plan_segments(progress: Dict) -> Tuple[List[Optional[int]], Optional[Tuple[int, int]]]:
+    """
+    Decide which slices of the dataset this run has to fetch.
+
+    Without a watermark the whole state is one unfiltered segment (None).
+    With one, only years from the watermark onwards are requested and
+    records older than the lookback window are skipped.
+    """
+    if progress["watermark_year"] is None:
+        return [None], None
+    
+    year, month = progress["watermark_year"], progress["watermark_month"] or 1
+    months_back = year * 12 + (month - 1) - INGEST_LOOKBACK_MONTHS
+    cutoff = (months_back // 12, months_back % 12 + 1)
+    
+    if not DATAGOV_YEAR_FILTER:
+        return [None], cutoff
+    return list(range(cutoff[0], max(cutoff[0], datetime.now().year) + 1)), cutoff
+
+@statement_scope("rows_written_since")
+def rows_written_since(conn, state: str, since: datetime) -> set:
+    """(state, district, year, month) keys written for a state since the given time"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT state_name, district_name, year, month
+        FROM mgnrega_monthly
+        WHERE state_name = %s AND snapshot_date >= %s
+    """, (state, since))
+    keys = set(cur.fetchall())
+    cur.close()
+    return keys
+
+class StageTimer:
+    """Wall time spent in each stage of an ingestion run"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from `iterable`, charging the time spent waiting for items to `name`"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self) -> Dict[str, float]:
+        return {f"{name}_s": round(seconds, 3) for name, seconds in self.seconds.items()}
+
+def fetch_and_store(state: str = "Uttar Pradesh", refresh: bool = True,
+                    rate: Optional[float] = None):
+    """
+    Main ingestion function.
+
+    Runs are incremental once a state has a watermark, and staged rows are
+    merged every CHECKPOINT_PAGES pages together with a resume point, so an
+    interrupted run continues where it stopped instead of starting over.
+
+    With `refresh=False` the derived tables are left for the caller to
+    refresh once (see `refresh_derived`) after several states have run.
+    `rate` overrides the request rate when the API quota is shared.
+
+    Returns the number of records processed and rejected, how many rows
+    were inserted, updated or left unchanged, the time spent per stage
+    (`timings`: waiting for pages, normalizing, storing, refreshing) and
+    what rate limiting and retries cost (`fetch`, see `TokenBucket.stats`).
+    """
     logger.info(f"Starting data ingestion for {state}")
     
     params = {
         "filters[state_name]": state
     }
     
-    page = 1
     total_records = 0
+    total_rejected = 0
+    limiter = TokenBucket(rate if rate is not None else DATAGOV_RATE_PER_SEC)
+    timer = StageTimer()
+    started = time.perf_counter()
     
-    while True:
-        try:
-            data = fetch_page(params, page=page)
-            
-            if not data:
-                logger.warning("No data returned from API")
-                break
-            
-            records = data.get("records", [])
-            
-            if not records:
-                logger.info("No more records to fetch")
-                break
-            
-            # Normalize records
-            normalized = []
-            for rec in records:
-                normalized_rec = normalize_record(rec)
-                if normalized_rec:
-                    normalized.append(normalized_rec)
-            
-            # Store in database
-            if normalized:
-                store_records(normalized)
-                total_records += len(normalized)
-            
-            # Check if there are more pages
-            if len(records) < 500:  # Assuming 500 is per_page
-                break
+    conn = connect()
+    try:
+        progress = start_run(conn, state)
+        segments, cutoff = plan_segments(progress)
+        resume_page = progress["resume_page"]
+        resume_segment = progress["resume_segment"]
+        
+        if resume_page is not None:
+            logger.info(f"Resuming {state} at segment {resume_segment}, page {resume_page}")
+            if resume_segment in segments:
+                segments = segments[segments.index(resume_segment):]
+        else:
+            resume_segment = segments[0]
+            resume_page = 1
+        if cutoff:
+            logger.info(f"Incremental run for {state} from {cutoff[0]}-{cutoff[1]:02d}")
+        
+        loader = BulkLoader(conn)
+        
+        for index, segment in enumerate(segments):
+            segment_params = dict(params)
+            if segment is not None:
+                segment_params[f"filters[{DATAGOV_YEAR_FILTER}]"] = segment
+            start_page = resume_page if segment == resume_segment else 1
+            pages_since_checkpoint = 0
             
-            page += 1
-            time.sleep(0.5)  # Be nice to the API
+            # Time spent blocked on the next page counts as fetching
+            for page, data in timer.iterate(
+                "fetch", iter_pages(segment_params, limiter=limiter, start_page=start_page)
+            ):
+                records = data.get("records", [])
+                
+                if not records:
+                    logger.info("No more records to fetch")
+                    break
+                
+                with timer.stage("normalize"):
+                    normalized, rejected = normalize_page(records)
+                if rejected:
+                    total_rejected += len(rejected)
+                    reasons = sorted({row["reason"] for row in rejected})
+                    logger.warning(
+                        f"Rejected {len(rejected)} of {len(records)} records on page "
+                        f"{page}: {'; '.join(reasons)}"
+                    )
+                if cutoff:
+                    normalized = [
+                        rec for rec in normalized if (rec["year"], rec["month"]) >= cutoff
+                    ]
+                
+                with timer.stage("store"):
+                    if normalized:
+                        loader.stage(normalized)
+                        total_records += len(normalized)
+                    
+                    pages_since_checkpoint += 1
+                    if pages_since_checkpoint >= CHECKPOINT_PAGES:
+                        save_checkpoint(conn, loader, state, segment, page + 1)
+                        pages_since_checkpoint = 0
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed: {e}")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            break
+            if index + 1 < len(segments):
+                with timer.stage("store"):
+                    save_checkpoint(conn, loader, state, segments[index + 1], 1)
+        
+        with timer.stage("store"):
+            loader.merge()
+            conn.commit()
+            finish_run(conn, state, "complete", rejected=total_rejected)
+        result = {"records": total_records, "rejected": total_rejected, **loader.counts()}
+    except Exception as e:
+        conn.rollback()
+        if isinstance(e, requests.exceptions.RequestException):
+            logger.error(f"Request failed for {state}, will resume from last checkpoint: {e}")
+        else:
+            logger.error(f"Unexpected error for {state}, will resume from last checkpoint: {e}")
+        try:
+            finish_run(conn, state, "failed", str(e), rejected=total_rejected)
+        except psycopg2.Error:
+            logger.exception("Could not record failed run")
+        raise
+    finally:
+        conn.close()
     
-    # Refresh state averages
-    refresh_state_averages()
+    if refresh:
+        with timer.stage("refresh"):
+            refresh_derived({state: total_records})
     
-    logger.info(f"Ingestion complete. Total records processed: {total_records}")
-    return total_records
+    timer.add("total", time.perf_counter() - started)
+    result["timings"] = timer.as_dict()
+    result["fetch"] = limiter.stats()
+    logger.info(
+        f"Ingestion complete. Total records processed: {total_records} "
+        f"({result['inserted']} inserted, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {total_rejected} rejected) in "
+        f"{timer.seconds['total']:.1f}s: "
+        + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timer.seconds.items()
+                    if name != "total")
+    )
+    return result
 
 if __name__ == "__main__":
     state = os.getenv("INGEST_STATE", "Uttar Pradesh")
@@ -1,15 +1,23 @@
 """
 FastAPI main application
 """
-from fastapi import FastAPI, HTTPException, Query
+import os
+import hmac
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from datetime import datetime, timedelta
-import psycopg2.extras
-from app.db import get_db, return_db, init_db
+from psycopg2.errors import QueryCanceled
+from typing import Any, Callable, Hashable, List, Optional, Tuple, Union
+from app import queries
+from app.cache import ResponseCache, SnapshotVersion, TILE_CACHE_ENTRIES
+from app.db import run_db, init_db, close_db, pool_stats
+from app.pool import PoolTimeout
+from app.http_cache import validator_headers, is_not_modified
+from app.metrics import CONTENT_TYPE, Counter, Gauge, MetricsMiddleware, registry
+from app.spatial import DistrictLocator
+from app.tracing import tracer
 from app.models import (
-    District, DistrictCurrentMetrics, DistrictTrends,
-    DetectDistrictRequest, DetectDistrictResponse, MGNREGAMetric
+    District, DistrictCurrentMetrics, DistrictTrends, DistrictTrendsColumnar,
+    DetectDistrictRequest, DetectDistrictResponse
 )
 
 app = FastAPI(title="MGNREGA API", version="1.0.0")
@@ -21,12 +29,176 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
+# Added last so it is outermost and times the whole request
+app.add_middleware(MetricsMiddleware)
+
+# Upper bound on ids accepted by /districts/current
+MAX_BATCH_DISTRICTS = 200
+# Deepest zoom level served by /tiles
+MAX_TILE_ZOOM = 18
+TILE_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+# Seconds clients are asked to back off when the database is saturated
+OVERLOAD_RETRY_AFTER = 1
+# Shared secret for /admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+response_cache = ResponseCache()
+snapshot_version = SnapshotVersion(lambda: run_db(queries.get_data_version))
+snapshot_version.on_change(response_cache.clear)
+# Tiles are large and numerous, so they get their own LRU
+tile_cache = ResponseCache(maxsize=TILE_CACHE_ENTRIES)
+snapshot_version.on_change(tile_cache.clear)
+
+district_locator = DistrictLocator()
+
+def _cache_samples(field: str):
+    caches = {
+        "response": response_cache.stats,
+        "tiles": tile_cache.stats,
+        "detect_district": district_locator.stats,
+    }
+    return lambda: {(name,): stats()[field] for name, stats in caches.items()}
+
+for field in ("hits", "misses", "evictions"):
+    registry.register(Counter(
+        f"mgnrega_cache_{field}_total", f"Cache {field} per cache", ("cache",),
+        collect=_cache_samples(field)
+    ))
+registry.register(Gauge(
+    "mgnrega_cache_hit_ratio", "Hits over lookups since startup", ("cache",),
+    collect=_cache_samples("hit_ratio")
+))
+registry.register(Gauge(
+    "mgnrega_cache_entries", "Entries currently cached", ("cache",),
+    collect=_cache_samples("entries")
+))
+registry.register(Gauge(
+    "mgnrega_db_pool_connections", "Pooled connections by status (in_use, idle, max)",
+    ("status",),
+    collect=lambda: {
+        (status,): value for status, value in pool_stats().items()
+        if status in ("in_use", "idle", "max")
+    }
+))
+registry.register(Gauge(
+    "mgnrega_db_pool_waiting", "Queries queued for a free connection",
+    collect=lambda: {(): pool_stats()["waiting"]}
+))
+registry.register(Counter(
+    "mgnrega_db_pool_discarded_total",
+    "Pooled connections closed as broken, failing validation or past their lifetime",
+    collect=lambda: {(): pool_stats()["discarded"]}
+))
+
+# Ingestion runs happen in the worker; their outcome is read from
+# state_snapshot_metadata when metrics are scraped
+INGEST_GAUGES = {
+    "duration_s": registry.register(Gauge(
+        "mgnrega_ingest_last_run_duration_seconds",
+        "Duration of the state's last finished ingestion run", ("state",)
+    )),
+    "last_run_rows": registry.register(Gauge(
+        "mgnrega_ingest_last_run_rows", "Rows processed by the state's last run", ("state",)
+    )),
+    "last_run_rejected": registry.register(Gauge(
+        "mgnrega_ingest_last_run_rejected", "Records rejected by the state's last run", ("state",)
+    )),
+    "succeeded": registry.register(Gauge(
+        "mgnrega_ingest_last_run_success", "1 if the state's last run completed, 0 if it failed",
+        ("state",)
+    )),
+    "failed_runs": registry.register(Counter(
+        "mgnrega_ingest_failed_runs_total", "Failed ingestion runs per state", ("state",)
+    )),
+    "row_count": registry.register(Gauge(
+        "mgnrega_ingest_rows", "Rows stored for the state", ("state",)
+    )),
+    "last_updated": registry.register(Gauge(
+        "mgnrega_ingest_last_update_timestamp_seconds",
+        "When the state's data last changed (Unix time)", ("state",)
+    )),
+}
+
+def record_ingestion_status(runs):
+    samples = {field: {} for field in INGEST_GAUGES}
+    for run in runs:
+        labels = (run["state_name"],)
+        if run["run_status"] in ("complete", "failed"):
+            run["succeeded"] = 1 if run["run_status"] == "complete" else 0
+        if run["last_updated"] is not None:
+            run["last_updated"] = run["last_updated"].timestamp()
+        for field in INGEST_GAUGES:
+            if run.get(field) is not None:
+                samples[field][labels] = float(run[field])
+    for field, gauge in INGEST_GAUGES.items():
+        gauge.replace(samples[field])
+
+def server_error(e: Exception) -> HTTPException:
+    """
+    503 with Retry-After when the database is saturated (no pooled
+    connection freed up in time, or statement_timeout hit), 500 otherwise
+    """
+    if isinstance(e, (PoolTimeout, QueryCanceled)):
+        return HTTPException(
+            status_code=503, detail=str(e).strip(),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER)}
+        )
+    return HTTPException(status_code=500, detail=str(e))
+
+async def cached_query(key: Hashable, fn: Callable[..., Any], *args: Any,
+                       cache: ResponseCache = response_cache) -> Any:
+    """
+    Run a query through a response cache (the shared one by default).
+
+    Entries are keyed by the current snapshot version, so a new ingestion
+    run invalidates them; None results (unknown ids) are not cached.
+    """
+    version = await snapshot_version.current()
+    cache_key = (key, version)
+    hit, value = cache.get(cache_key)
+    if hit:
+        return value
+
+    value = await run_db(fn, *args)
+    if value is not None:
+        cache.set(cache_key, value)
+    return value
+
+async def check_not_modified(request: Request, response: Response) -> Optional[Response]:
+    """
+    Attach snapshot-derived validators to the response.
+
+    Returns a 304 response when the client's If-None-Match/If-Modified-Since
+    already matches, so the caller can skip its queries entirely. Endpoints
+    for a single resource look it up first, so unknown ids still get a 404.
+    """
+    version = await snapshot_version.current()
+    if version is None:
+        return None
+
+    headers = validator_headers(version, request)
+    if is_not_modified(request, headers["ETag"], version):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database and the in-memory district index on startup"""
     init_db()
+    # Prime the version first so the initial load is not repeated by the
+    # listener; after that, boundaries are reloaded with each new snapshot
+    await snapshot_version.current()
+    await district_locator.reload()
+    snapshot_version.on_change(district_locator.schedule_reload)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections"""
+    close_db()
 
 @app.get("/")
 async def root():
@@ -36,262 +208,223 @@ async def root():
 async def health():
     """Health check endpoint"""
     try:
-        conn = get_db()
-        conn.close()
-        return_db(conn)
+        await run_db(queries.ping)
         return {"status": "healthy"}
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 @app.get("/districts", response_model=List[District])
 async def list_districts(
+    request: Request,
+    response: Response,
     state_name: Optional[str] = Query(None, description="Filter by state name")
 ):
     """List all districts, optionally filtered by state"""
-    conn = get_db()
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        if state_name:
-            cur.execute("""
-                SELECT id, state_name, district_name, state_code, district_code
-                FROM districts
-                WHERE state_name = %s
-                ORDER BY district_name
-            """, (state_name,))
-        else:
-            cur.execute("""
-                SELECT id, state_name, district_name, state_code, district_code
-                FROM districts
-                ORDER BY state_name, district_name
-            """)
-        
-        rows = cur.fetchall()
-        cur.close()
-        
-        return [District(**dict(row)) for row in rows]
+        not_modified = await check_not_modified(request, response)
+        if not_modified:
+            return not_modified
+        return await cached_query(
+            ("districts", state_name), queries.list_districts, state_name
+        )
+    except Exception as e:
+        raise server_error(e)
+
+@app.get("/districts/current", response_model=List[DistrictCurrentMetrics])
+async def get_districts_current(
+    request: Request,
+    response: Response,
+    ids: Optional[List[int]] = Query(None, description="District ids (repeat the parameter)"),
+    state_name: Optional[str] = Query(None, description="All districts of this state")
+):
+    """Get current metrics and state averages for many districts at once"""
+    if (ids is None) == (state_name is None):
+        raise HTTPException(status_code=400, detail="Pass either ids or state_name")
+    if ids is not None and len(ids) > MAX_BATCH_DISTRICTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_DISTRICTS} ids per request"
+        )
+
+    district_ids = sorted(set(ids)) if ids is not None else None
+    try:
+        not_modified = await check_not_modified(request, response)
+        if not_modified:
+            return not_modified
+        return await cached_query(
+            ("current-batch", tuple(district_ids) if district_ids else None, state_name),
+            queries.get_districts_current, district_ids, state_name
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return_db(conn)
+        raise server_error(e)
 
 @app.get("/district/{district_id}/current", response_model=DistrictCurrentMetrics)
-async def get_district_current(district_id: int):
+async def get_district_current(district_id: int, request: Request, response: Response):
     """Get current metrics for a district"""
-    conn = get_db()
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Get district info
-        cur.execute("""
-            SELECT id, state_name, district_name, state_code, district_code
-            FROM districts
-            WHERE id = %s
-        """, (district_id,))
-        
-        district_row = cur.fetchone()
-        if not district_row:
-            raise HTTPException(status_code=404, detail="District not found")
-        
-        district = District(**dict(district_row))
-        
-        # Get latest metrics (last 3 months)
-        cur.execute("""
-            SELECT state_name, district_name, year, month,
-                   persondays, total_households_worked, avg_days_per_household,
-                   wages_lakhs, women_persondays, women_percentage, snapshot_date
-            FROM mgnrega_monthly
-            WHERE district_name = %s AND state_name = %s
-            ORDER BY year DESC, month DESC
-            LIMIT 3
-        """, (district.district_name, district.state_name))
-        
-        metric_rows = cur.fetchall()
-        
-        # Get state averages for latest month
-        if metric_rows:
-            latest = metric_rows[0]
-            cur.execute("""
-                SELECT avg_persondays, avg_households, avg_days_per_household,
-                       avg_wages, avg_women_pct
-                FROM state_monthly_averages
-                WHERE state_name = %s AND year = %s AND month = %s
-            """, (district.state_name, latest['year'], latest['month']))
-            
-            state_avg_row = cur.fetchone()
-            state_averages = dict(state_avg_row) if state_avg_row else None
-        else:
-            state_averages = None
-        
-        # Get latest snapshot date
-        cur.execute("""
-            SELECT MAX(snapshot_date) as latest_date
-            FROM mgnrega_monthly
-        """)
-        snapshot_row = cur.fetchone()
-        latest_snapshot_date = snapshot_row['latest_date'] if snapshot_row and snapshot_row['latest_date'] else datetime.now()
-        
-        metrics = [MGNREGAMetric(**dict(row)) for row in metric_rows]
-        
-        cur.close()
-        
-        return DistrictCurrentMetrics(
-            district=district,
-            metrics=metrics,
-            state_averages=state_averages,
-            latest_snapshot_date=latest_snapshot_date
+        # Looked up before the validators: an unknown id is a 404 even when
+        # the client's ETag matches the current snapshot
+        result = await cached_query(
+            ("current", district_id), queries.get_district_current, district_id
         )
-    except HTTPException:
-        raise
+        not_modified = None
+        if result is not None:
+            not_modified = await check_not_modified(request, response)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return_db(conn)
+        raise server_error(e)
 
-@app.get("/district/{district_id}/trends", response_model=DistrictTrends)
+    if result is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    if not_modified:
+        return not_modified
+    return result
+
+def parse_period(value: Optional[str], name: str) -> Optional[Tuple[int, int]]:
+    """Parse a YYYY-MM query parameter into (year, month)"""
+    if value is None:
+        return None
+    try:
+        year, month = (int(part) for part in value.split("-"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM")
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM")
+    return year, month
+
+@app.get(
+    "/district/{district_id}/trends",
+    response_model=Union[DistrictTrends, DistrictTrendsColumnar]
+)
 async def get_district_trends(
     district_id: int,
-    months: int = Query(12, description="Number of months of trend data")
+    request: Request,
+    response: Response,
+    months: int = Query(12, description="Number of months of trend data (ignored when from is set)"),
+    period_from: Optional[str] = Query(None, alias="from", description="First month, YYYY-MM"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last month, YYYY-MM"),
+    metrics: Optional[str] = Query(
+        None, description="Comma-separated subset of " + ",".join(queries.TREND_METRICS)
+    ),
+    format: str = Query("points", pattern="^(points|columnar)$",
+                        description="points (default) or columnar")
 ):
     """Get trend data for a district"""
-    conn = get_db()
+    start = parse_period(period_from, "from")
+    end = parse_period(period_to, "to")
+    selected = None
+    if metrics:
+        selected = [name.strip() for name in metrics.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in queries.TREND_METRICS]
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown metrics: {', '.join(unknown)}"
+            )
+    columnar = format == "columnar"
+
+    try:
+        # Looked up before the validators, as in get_district_current
+        result = await cached_query(
+            ("trends", district_id, months, start, end,
+             tuple(selected) if selected else None, columnar),
+            queries.get_district_trends,
+            district_id, months, start, end, selected, columnar
+        )
+        not_modified = None
+        if result is not None:
+            not_modified = await check_not_modified(request, response)
+    except Exception as e:
+        raise server_error(e)
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    if not_modified:
+        return not_modified
+    return result
+
+@app.get("/tiles/{z}/{x}/{y}.pbf")
+async def get_tile(z: int, x: int, y: int, request: Request, response: Response):
+    """District boundaries as a Mapbox vector tile (layer "districts")"""
+    if not 0 <= z <= MAX_TILE_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Get district name
-        cur.execute("""
-            SELECT district_name FROM districts WHERE id = %s
-        """, (district_id,))
-        
-        district_row = cur.fetchone()
-        if not district_row:
-            raise HTTPException(status_code=404, detail="District not found")
-        
-        district_name = district_row['district_name']
-        
-        # Get trend data for last N months
-        cur.execute("""
-            SELECT year, month, persondays, total_households_worked,
-                   avg_days_per_household, wages_lakhs, women_percentage
-            FROM mgnrega_monthly
-            WHERE district_name = %s
-            ORDER BY year DESC, month DESC
-            LIMIT %s
-        """, (district_name, months))
-        
-        rows = cur.fetchall()
-        cur.close()
-        
-        # Format trends
-        trends = {
-            "persondays": [
-                {
-                    "year": r['year'],
-                    "month": r['month'],
-                    "value": float(r['persondays'] or 0),
-                    "label": f"{r['year']}-{r['month']:02d}"
-                }
-                for r in reversed(rows)
-            ],
-            "households": [
-                {
-                    "year": r['year'],
-                    "month": r['month'],
-                    "value": float(r['total_households_worked'] or 0),
-                    "label": f"{r['year']}-{r['month']:02d}"
-                }
-                for r in reversed(rows)
-            ],
-            "avg_days": [
-                {
-                    "year": r['year'],
-                    "month": r['month'],
-                    "value": float(r['avg_days_per_household'] or 0),
-                    "label": f"{r['year']}-{r['month']:02d}"
-                }
-                for r in reversed(rows)
-            ],
-            "wages": [
-                {
-                    "year": r['year'],
-                    "month": r['month'],
-                    "value": float(r['wages_lakhs'] or 0),
-                    "label": f"{r['year']}-{r['month']:02d}"
-                }
-                for r in reversed(rows)
-            ],
-            "women_pct": [
-                {
-                    "year": r['year'],
-                    "month": r['month'],
-                    "value": float(r['women_percentage'] or 0),
-                    "label": f"{r['year']}-{r['month']:02d}"
-                }
-                for r in reversed(rows)
-            ]
-        }
-        
-        return DistrictTrends(district_name=district_name, trends=trends)
-    except HTTPException:
-        raise
+        not_modified = await check_not_modified(request, response)
+        if not_modified:
+            return not_modified
+        tile = await cached_query(
+            ("tile", z, x, y), queries.get_district_tile, z, x, y, cache=tile_cache
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return_db(conn)
+        raise server_error(e)
+
+    # Returned responses do not inherit headers set on `response`
+    if not tile:
+        return Response(status_code=204, headers=dict(response.headers))
+    return Response(content=tile, media_type=TILE_MEDIA_TYPE, headers=dict(response.headers))
 
 @app.post("/detect-district", response_model=DetectDistrictResponse)
 async def detect_district(request: DetectDistrictRequest):
     """Detect district from latitude/longitude"""
-    conn = get_db()
+    located = district_locator.locate(request.latitude, request.longitude)
+    if located is not None:
+        return located
+
+    # No in-memory index available: ask PostGIS
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # PostGIS point-in-polygon query
-        cur.execute("""
-            SELECT district_name, state_name
-            FROM districts
-            WHERE ST_Contains(geom, ST_SetSRID(ST_Point(%s, %s), 4326))
-            LIMIT 1
-        """, (request.longitude, request.latitude))
-        
-        row = cur.fetchone()
-        cur.close()
-        
-        if row:
-            return DetectDistrictResponse(
-                district_name=row['district_name'],
-                state_name=row['state_name'],
-                found=True
-            )
-        else:
-            return DetectDistrictResponse(
-                district_name=None,
-                state_name=None,
-                found=False
-            )
+        return await run_db(
+            queries.detect_district, request.latitude, request.longitude
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return_db(conn)
+        raise server_error(e)
 
 @app.get("/snapshot-date")
-async def get_snapshot_date():
+async def get_snapshot_date(request: Request, response: Response):
     """Get the latest snapshot date"""
-    conn = get_db()
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute("""
-            SELECT MAX(snapshot_date) as latest_date
-            FROM mgnrega_monthly
-        """)
-        row = cur.fetchone()
-        cur.close()
-        
-        return {
-            "snapshot_date": row['latest_date'].isoformat() if row and row['latest_date'] else None
-        }
+        not_modified = await check_not_modified(request, response)
+        if not_modified:
+            return not_modified
+        latest_date = await cached_query("snapshot-date", queries.get_snapshot_date)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return_db(conn)
+        raise server_error(e)
+
+    return {
+        "snapshot_date": latest_date.isoformat() if latest_date else None
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    try:
+        record_ingestion_status(await run_db(queries.get_ingestion_status))
+    except Exception:
+        # Keep serving request, pool and cache metrics while the DB is down
+        pass
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response, tile and district-detection cache hit/miss counters"""
+    return {
+        **response_cache.stats(),
+        "tiles": tile_cache.stats(),
+        "detect_district": district_locator.stats(),
+    }
+
+def require_admin(token: Optional[str]):
+    # 404 rather than 401/403 so the admin endpoints are not discoverable
+    if not ADMIN_TOKEN or token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/admin/slow-queries", include_in_schema=False)
+async def slow_queries(x_admin_token: Optional[str] = Header(None)):
+    """Recent statements slower than SLOW_QUERY_MS, newest first, with sampled plans"""
+    require_admin(x_admin_token)
+    return tracer.snapshot()
 
+@app.delete("/admin/slow-queries", include_in_schema=False)
+async def clear_slow_queries(x_admin_token: Optional[str] = Header(None)):
+    """Empty the slow-query log and reset plan capture rate limits"""
+    require_admin(x_admin_token)
+    tracer.clear()
+    return {"cleared": True}
@@ -2,7 +2,7 @@
 Data models and schemas
 """
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class District(BaseModel):
@@ -41,6 +41,11 @@ class DistrictTrends(BaseModel):
     district_name: str
     trends: dict  # Key: metric_name, Value: List[TrendDataPoint]
 
+class DistrictTrendsColumnar(BaseModel):
+    district_name: str
+    periods: List[str]  # "YYYY-MM", oldest first
+    series: Dict[str, List[float]]  # Key: metric_name, one value per period
+
 class DetectDistrictRequest(BaseModel):
     latitude: float
     longitude: float
@@ -0,0 +1,190 @@
+"""
+Bounded, thread-safe PostgreSQL connection pool
+
+Unlike psycopg2's pools, which raise as soon as every connection is
+checked out, callers here queue for up to `timeout` seconds and then get
+`PoolTimeout`. Connections are validated when they change hands:
+- Broken connections are dropped on return.
+- Unfinished transactions are rolled back on return.
+- Connections idle longer than `validate_after` are pinged on checkout.
+- Connections older than `max_lifetime` are replaced, so server-side
+  memory and stale state do not build up.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(PoolError):
+    """No connection became free within the pool's timeout"""
+
+class BoundedConnectionPool:
+    def __init__(self, minconn: int, maxconn: int, dsn: str, timeout: float = 10.0,
+                 max_lifetime: float = 1800.0, validate_after: float = 30.0,
+                 statement_timeout_ms: int = 0,
+                 connection_factory=psycopg2.extensions.connection):
+        if not 0 <= minconn <= maxconn or maxconn < 1:
+            raise ValueError("Need 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.statement_timeout_ms = statement_timeout_ms
+        self.connection_factory = connection_factory
+        self.closed = False
+
+        # Idle connections as (connection, returned at), most recent last
+        self._idle: Deque[Tuple[psycopg2.extensions.connection, float]] = deque()
+        # Creation time of every open connection, idle or checked out
+        self._created: Dict[int, float] = {}
+        self._in_use = 0
+        # Slots reserved by threads currently opening a connection
+        self._opening = 0
+        self._waiting = 0
+        self.discarded = 0
+        self._cond = threading.Condition()
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        kwargs = {"connection_factory": self.connection_factory}
+        if self.statement_timeout_ms:
+            kwargs["options"] = f"-c statement_timeout={int(self.statement_timeout_ms)}"
+        conn = psycopg2.connect(self.dsn, **kwargs)
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _expired(self, conn, now: float) -> bool:
+        return bool(self.max_lifetime) and now - self._created.get(id(conn), now) > self.max_lifetime
+
+    def _discard(self, conn):
+        """Close a connection and free its slot (call with the lock held)"""
+        self._created.pop(id(conn), None)
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._cond.notify()
+
+    def _usable(self, conn, idle_since: float, now: float) -> bool:
+        """Checkout validation, run without the lock"""
+        if conn.closed or self._expired(conn, now):
+            return False
+        if self.validate_after and now - idle_since > self.validate_after:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Dropping pooled connection that failed validation: {e}")
+                return False
+        return True
+
+    def getconn(self, timeout: Optional[float] = None) -> psycopg2.extensions.connection:
+        """
+        Check out a connection, waiting up to `timeout` seconds (the pool's
+        default when None) for one to be returned; raises PoolTimeout.
+        """
+        wait = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + wait
+        while True:
+            with self._cond:
+                conn = None
+                while True:
+                    if self.closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if len(self._created) + self._opening < self.maxconn:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection free within {wait:.3g}s "
+                            f"({self.maxconn} in use)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if conn is None:
+                            self._cond.notify()
+                with self._cond:
+                    self._in_use += 1
+                return conn
+
+            if self._usable(conn, idle_since, time.monotonic()):
+                return conn
+            with self._cond:
+                self._in_use -= 1
+                self._discard(conn)
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection, rolling back anything left open"""
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._cond:
+            if id(conn) not in self._created:
+                raise PoolError("trying to put unkeyed connection")
+            self._in_use -= 1
+            if close or conn.closed or self.closed or self._expired(conn, time.monotonic()):
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "discarded": self.discarded,
+            }
+
+    def closeall(self):
+        """Close idle connections now; checked-out ones are closed when returned"""
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._created.pop(id(conn), None)
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._cond.notify_all()
@@ -0,0 +1,370 @@
+"""
+Blocking read queries used by the API
+
+Each function takes a pooled psycopg2 connection as its first argument and is
+meant to be run through ``app.db.run_db`` so it executes off the event loop.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+from datetime import datetime
+import psycopg2.extras
+from app.db import DISTRICT_LATEST_MONTHS, DISTRICT_TILE_LEVELS, TILE_EXTENT
+from app.models import (
+    District, DistrictCurrentMetrics, DistrictTrends, DistrictTrendsColumnar,
+    DetectDistrictResponse, MGNREGAMetric
+)
+
+def _cursor(conn):
+    return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+def _latest_snapshot(cur) -> Optional[datetime]:
+    cur.execute("""
+        SELECT latest_snapshot FROM snapshot_metadata WHERE id = 1
+    """)
+    row = cur.fetchone()
+    return row['latest_snapshot'] if row else None
+
+def ping(conn) -> None:
+    """Round-trip a trivial statement to prove the connection is usable"""
+    cur = conn.cursor()
+    cur.execute("SELECT 1")
+    cur.fetchone()
+    cur.close()
+
+def list_districts(conn, state_name: Optional[str] = None) -> List[District]:
+    """List all districts, optionally filtered by state"""
+    cur = _cursor(conn)
+
+    if state_name:
+        cur.execute("""
+            SELECT id, state_name, district_name, state_code, district_code
+            FROM districts
+            WHERE state_name = %s
+            ORDER BY district_name
+        """, (state_name,))
+    else:
+        cur.execute("""
+            SELECT id, state_name, district_name, state_code, district_code
+            FROM districts
+            ORDER BY state_name, district_name
+        """)
+
+    rows = cur.fetchall()
+    cur.close()
+
+    return [District(**dict(row)) for row in rows]
+
+def get_districts_current(
+    conn,
+    district_ids: Optional[List[int]] = None,
+    state_name: Optional[str] = None
+) -> List[DistrictCurrentMetrics]:
+    """
+    Get current metrics for many districts with set-based queries.
+
+    Districts are selected by id or by state. Those with a precomputed
+    district_latest summary are answered by the first query; the rest are
+    computed from mgnrega_monthly and state_monthly_averages in one query
+    each, whatever the number of districts.
+    """
+    cur = _cursor(conn)
+
+    if district_ids is not None:
+        district_filter, filter_param = "d.id = ANY(%s)", list(district_ids)
+    else:
+        district_filter, filter_param = "d.state_name = %s", state_name
+
+    cur.execute(f"""
+        SELECT d.id, d.state_name, d.district_name, d.state_code, d.district_code,
+               dl.metrics, dl.state_averages, dl.snapshot_date,
+               (SELECT latest_snapshot FROM snapshot_metadata WHERE id = 1) AS latest_snapshot
+        FROM districts d
+        LEFT JOIN district_latest dl ON dl.district_id = d.id
+        WHERE {district_filter}
+        ORDER BY d.state_name, d.district_name
+    """, (filter_param,))
+    rows = cur.fetchall()
+
+    # Fall back for districts not summarized yet (e.g. no ingestion since
+    # the district was added)
+    missing = [row for row in rows if row['metrics'] is None]
+    if missing:
+        _fill_current_metrics(cur, missing)
+
+    cur.close()
+
+    results = []
+    for row in rows:
+        results.append(DistrictCurrentMetrics(
+            district=District(
+                id=row['id'],
+                state_name=row['state_name'],
+                district_name=row['district_name'],
+                state_code=row['state_code'],
+                district_code=row['district_code']
+            ),
+            metrics=[MGNREGAMetric(**metric) for metric in row['metrics']],
+            state_averages=row['state_averages'],
+            latest_snapshot_date=row['latest_snapshot'] or row['snapshot_date'] or datetime.now()
+        ))
+    return results
+
+def _fill_current_metrics(cur, rows: List[dict]):
+    """Compute metrics and state averages for summary-less district rows in place"""
+    ids = [row['id'] for row in rows]
+
+    cur.execute("""
+        SELECT district_id, state_name, district_name, year, month,
+               persondays, total_households_worked, avg_days_per_household,
+               wages_lakhs, women_persondays, women_percentage, snapshot_date
+        FROM (
+            SELECT m.district_id, d.state_name, d.district_name, m.year, m.month,
+                   m.persondays, m.total_households_worked, m.avg_days_per_household,
+                   m.wages_lakhs, m.women_persondays, m.women_percentage, m.snapshot_date,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY m.district_id ORDER BY m.year DESC, m.month DESC
+                   ) AS rn
+            FROM mgnrega_monthly m
+            JOIN districts d ON d.id = m.district_id
+            WHERE m.district_id = ANY(%s)
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY district_id, year DESC, month DESC
+    """, (ids, DISTRICT_LATEST_MONTHS))
+
+    metrics_by_id: Dict[int, List[dict]] = {}
+    for metric in cur.fetchall():
+        district_id = metric.pop('district_id')
+        metrics_by_id.setdefault(district_id, []).append(dict(metric))
+
+    # State averages for each district's latest month
+    latest_periods = {
+        (metrics[0]['state_name'], metrics[0]['year'], metrics[0]['month'])
+        for metrics in metrics_by_id.values()
+    }
+    averages: Dict[Tuple[str, int, int], dict] = {}
+    if latest_periods:
+        states, years, months = (list(column) for column in zip(*latest_periods))
+        cur.execute("""
+            SELECT state_name, year, month,
+                   avg_persondays, avg_households, avg_days_per_household,
+                   avg_wages, avg_women_pct
+            FROM state_monthly_averages
+            WHERE (state_name, year, month) IN (
+                SELECT * FROM unnest(%s::text[], %s::int[], %s::int[])
+            )
+        """, (states, years, months))
+        for avg in cur.fetchall():
+            key = (avg.pop('state_name'), avg.pop('year'), avg.pop('month'))
+            # Match the JSON numbers stored in district_latest
+            averages[key] = {
+                name: float(value) if value is not None else None
+                for name, value in avg.items()
+            }
+
+    for row in rows:
+        metrics = metrics_by_id.get(row['id'], [])
+        row['metrics'] = metrics
+        row['state_averages'] = averages.get(
+            (metrics[0]['state_name'], metrics[0]['year'], metrics[0]['month'])
+        ) if metrics else None
+
+def get_district_current(conn, district_id: int) -> Optional[DistrictCurrentMetrics]:
+    """Get current metrics for a district, or None if the district is unknown"""
+    results = get_districts_current(conn, district_ids=[district_id])
+    return results[0] if results else None
+
+# Trend series name -> mgnrega_monthly column
+TREND_METRICS = {
+    "persondays": "persondays",
+    "households": "total_households_worked",
+    "avg_days": "avg_days_per_household",
+    "wages": "wages_lakhs",
+    "women_pct": "women_percentage",
+}
+
+def get_district_trends(
+    conn,
+    district_id: int,
+    months: int,
+    period_from: Optional[Tuple[int, int]] = None,
+    period_to: Optional[Tuple[int, int]] = None,
+    metrics: Optional[List[str]] = None,
+    columnar: bool = False
+) -> Optional[Union[DistrictTrends, DistrictTrendsColumnar]]:
+    """
+    Get trend data for a district, or None if the district is unknown.
+
+    Without `period_from` the last `months` months are returned; with it,
+    every month in [period_from, period_to]. `metrics` selects a subset of
+    TREND_METRICS (all by default).
+    """
+    cur = _cursor(conn)
+
+    # Get district name
+    cur.execute("""
+        SELECT district_name FROM districts WHERE id = %s
+    """, (district_id,))
+
+    district_row = cur.fetchone()
+    if not district_row:
+        cur.close()
+        return None
+
+    district_name = district_row['district_name']
+    selected = [(name, TREND_METRICS[name]) for name in (metrics or TREND_METRICS)]
+
+    conditions = ["district_id = %(district_id)s"]
+    params = {"district_id": district_id}
+    if period_from:
+        conditions.append("year >= %(from_year)s AND (year, month) >= (%(from_year)s, %(from_month)s)")
+        params.update(from_year=period_from[0], from_month=period_from[1])
+    if period_to:
+        conditions.append("year <= %(to_year)s AND (year, month) <= (%(to_year)s, %(to_month)s)")
+        params.update(to_year=period_to[0], to_month=period_to[1])
+    limit = ""
+    if not period_from:
+        limit = "LIMIT %(months)s"
+        params["months"] = months
+
+    columns = ", ".join(column for _, column in selected)
+    cur.execute(f"""
+        SELECT year, month, {columns}
+        FROM mgnrega_monthly
+        WHERE {" AND ".join(conditions)}
+        ORDER BY year DESC, month DESC
+        {limit}
+    """, params)
+
+    rows = cur.fetchall()
+    cur.close()
+    rows.reverse()
+
+    if columnar:
+        return DistrictTrendsColumnar(
+            district_name=district_name,
+            periods=[f"{r['year']}-{r['month']:02d}" for r in rows],
+            series={
+                name: [float(r[column] or 0) for r in rows]
+                for name, column in selected
+            }
+        )
+
+    # Format trends
+    trends = {name: [] for name, _ in selected}
+    for r in rows:
+        year, month = r['year'], r['month']
+        label = f"{year}-{month:02d}"
+        for name, column in selected:
+            trends[name].append({
+                "year": year,
+                "month": month,
+                "value": float(r[column] or 0),
+                "label": label
+            })
+
+    return DistrictTrends(district_name=district_name, trends=trends)
+
+def detect_district(conn, latitude: float, longitude: float) -> DetectDistrictResponse:
+    """Detect district from latitude/longitude"""
+    cur = _cursor(conn)
+
+    # PostGIS point-in-polygon query
+    cur.execute("""
+        SELECT district_name, state_name
+        FROM districts
+        WHERE ST_Contains(geom, ST_SetSRID(ST_Point(%s, %s), 4326))
+        LIMIT 1
+    """, (longitude, latitude))
+
+    row = cur.fetchone()
+    cur.close()
+
+    if row:
+        return DetectDistrictResponse(
+            district_name=row['district_name'],
+            state_name=row['state_name'],
+            found=True
+        )
+    return DetectDistrictResponse(
+        district_name=None,
+        state_name=None,
+        found=False
+    )
+
+def tile_geometry_column(zoom: int) -> Optional[str]:
+    """Simplified districts column for a zoom level, or None for full resolution"""
+    for max_zoom, column in DISTRICT_TILE_LEVELS:
+        if zoom <= max_zoom:
+            return column
+    return None
+
+def get_district_tile(conn, z: int, x: int, y: int) -> bytes:
+    """Mapbox vector tile of district boundaries; empty bytes when none intersect"""
+    column = tile_geometry_column(z)
+    if column:
+        geom = f"d.{column}"
+        bbox_filter = f"d.{column} && t.envelope"
+    else:
+        geom = "ST_Transform(d.geom, 3857)"
+        bbox_filter = "d.geom && ST_Transform(t.envelope, 4326)"
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        WITH t AS (
+            SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS envelope
+        )
+        SELECT ST_AsMVT(tile, 'districts', {TILE_EXTENT}, 'geom', 'id')
+        FROM (
+            SELECT d.id, d.district_name, d.state_name,
+                   ST_AsMVTGeom({geom}, t.envelope, {TILE_EXTENT}, 64, true) AS geom
+            FROM districts d, t
+            WHERE {bbox_filter}
+        ) tile
+        WHERE tile.geom IS NOT NULL
+    """, {"z": z, "x": x, "y": y})
+    row = cur.fetchone()
+    cur.close()
+
+    return bytes(row[0]) if row and row[0] else b""
+
+def get_ingestion_status(conn) -> List[Dict]:
+    """
+    Latest ingestion run of each state, as recorded by the worker. The
+    duration covers the last attempt only, not the gap before a resume.
+    """
+    cur = _cursor(conn)
+    cur.execute("""
+        SELECT state_name, run_status, row_count, last_run_rows, last_run_rejected,
+               failed_runs, last_updated,
+               CASE WHEN run_finished_at >= COALESCE(attempt_started_at, run_started_at)
+                    THEN EXTRACT(EPOCH FROM run_finished_at
+                                 - COALESCE(attempt_started_at, run_started_at))
+               END AS duration_s
+        FROM state_snapshot_metadata
+        ORDER BY state_name
+    """)
+    rows = [dict(row) for row in cur.fetchall()]
+    cur.close()
+    return rows
+
+def get_data_version(conn) -> Optional[datetime]:
+    """
+    Version of everything the API caches: the latest metrics snapshot or
+    boundary reload, whichever is newer
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT GREATEST(latest_snapshot, boundaries_updated_at)
+        FROM snapshot_metadata WHERE id = 1
+    """)
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else None
+
+def get_snapshot_date(conn) -> Optional[datetime]:
+    """Get the latest snapshot date"""
+    cur = _cursor(conn)
+    latest_date = _latest_snapshot(cur)
+    cur.close()
+
+    return latest_date
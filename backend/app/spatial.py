@@ -0,0 +1,143 @@
+"""
+In-process point-in-polygon lookup for /detect-district
+
+District geometries are loaded once (and again whenever the data snapshot
+changes) into an STR-tree of bounding boxes; candidates are confirmed with
+an exact test on prepared geometries. Answers are cached per rounded
+coordinate, so repeat visitors from the same area never reach the database.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from app.cache import ResponseCache
+from app.db import run_db
+from app.models import DetectDistrictResponse
+
+try:
+    from shapely import wkb
+    from shapely.geometry import Point
+    from shapely.prepared import prep
+    from shapely.strtree import STRtree
+except ImportError:  # detection falls back to PostGIS
+    STRtree = None
+
+logger = logging.getLogger(__name__)
+
+DETECT_CACHE_ENTRIES = int(os.getenv("DETECT_CACHE_ENTRIES", "10000"))
+# Decimal places kept when caching coordinates (4 is about 11 m)
+DETECT_CACHE_PRECISION = int(os.getenv("DETECT_CACHE_PRECISION", "4"))
+
+def load_district_geometries(conn) -> List[Tuple[str, str, bytes]]:
+    """(district_name, state_name, WKB) for every district with a boundary"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT district_name, state_name, ST_AsBinary(geom)
+        FROM districts
+        WHERE geom IS NOT NULL
+        ORDER BY id
+    """)
+    rows = [(district, state, bytes(geom)) for district, state, geom in cur.fetchall()]
+    cur.close()
+    return rows
+
+class DistrictIndex:
+    """STR-tree over district bounding boxes with prepared exact geometries"""
+
+    def __init__(self, rows: List[Tuple[str, str, bytes]]):
+        self.names: List[Tuple[str, str]] = []
+        geometries = []
+        for district, state, geom in rows:
+            try:
+                geometry = wkb.loads(geom)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable geometry for {district}, {state}: {e}")
+                continue
+            self.names.append((district, state))
+            geometries.append(geometry)
+
+        self._prepared = [prep(geometry) for geometry in geometries]
+        self._tree = STRtree(geometries)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, latitude: float, longitude: float) -> Optional[Tuple[str, str]]:
+        """(district_name, state_name) containing the point, or None"""
+        point = Point(longitude, latitude)
+        # Lowest district id wins where boundaries overlap
+        for i in sorted(self._tree.query(point)):
+            if self._prepared[i].contains(point):
+                return self.names[i]
+        return None
+
+class DistrictLocator:
+    """
+    Serves district detection from the current DistrictIndex.
+
+    `locate` returns None while no index is available (shapely missing,
+    no boundaries loaded or loading failed); callers then use PostGIS.
+    """
+
+    def __init__(self, cache_entries: int = DETECT_CACHE_ENTRIES,
+                 precision: int = DETECT_CACHE_PRECISION):
+        self.precision = precision
+        self._index: Optional[DistrictIndex] = None
+        self._cache = ResponseCache(maxsize=cache_entries)
+        self._reload_task: Optional[asyncio.Task] = None
+
+    async def reload(self):
+        """Rebuild the index from the database and swap it in"""
+        if STRtree is None:
+            return
+        started = time.monotonic()
+        try:
+            rows = await run_db(load_district_geometries)
+            index = None
+            if rows:
+                loop = asyncio.get_running_loop()
+                index = await loop.run_in_executor(None, DistrictIndex, rows)
+        except Exception as e:
+            logger.error(f"Could not load district geometries: {e}")
+            return
+
+        # An empty index would answer "not found" everywhere; use PostGIS
+        self._index = index if index is not None and len(index) else None
+        self._cache.clear()
+        logger.info(
+            f"District index loaded with {len(index) if index else 0} districts "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+
+    def schedule_reload(self):
+        """Reload in the background; the old index keeps serving meanwhile"""
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.get_running_loop().create_task(self.reload())
+
+    def locate(self, latitude: float, longitude: float) -> Optional[DetectDistrictResponse]:
+        index = self._index
+        if index is None:
+            return None
+
+        # The rounded point is both the cache key and the point tested, so
+        # a cached answer is exactly what a fresh lookup would return
+        key = (round(latitude, self.precision), round(longitude, self.precision))
+        hit, response = self._cache.get(key)
+        if hit:
+            return response
+
+        match = index.lookup(*key)
+        response = DetectDistrictResponse(
+            district_name=match[0] if match else None,
+            state_name=match[1] if match else None,
+            found=match is not None
+        )
+        self._cache.set(key, response)
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "districts": len(self._index) if self._index else 0,
+            **self._cache.stats(),
+        }
@@ -0,0 +1,233 @@
+"""
+Statement tracing with a slow-query log
+
+Connections created with `TracingConnection` time every `cursor.execute`.
+Each statement is named after the enclosing `statement_scope` (run_db uses
+the query function's name) plus its verb and main table, e.g.
+"get_district_trends: SELECT mgnrega_monthly". Durations feed the
+mgnrega_db_statement_duration_seconds histogram.
+
+Statements slower than SLOW_QUERY_MS are kept in a ring buffer. A sample of
+them also gets its plan captured on the same connection. Reads are
+re-run with EXPLAIN (ANALYZE, BUFFERS). Writes get a plain EXPLAIN, so
+nothing runs twice. Capture is rate-limited per statement name, as
+ANALYZE costs another execution.
+"""
+import os
+import re
+import time
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import psycopg2
+import psycopg2.extensions
+from app.metrics import DB_STATEMENT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Fraction of slow statements whose plan is captured, and the minimum
+# seconds between two captures for the same statement name
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+# Characters of SQL kept per slow-log entry
+MAX_SQL_LENGTH = 2000
+
+_VERB = re.compile(r"^\s*(\w+)")
+_TABLE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+([\w.]+)", re.IGNORECASE
+)
+_WRITES = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|pg_advisory\w*|nextval|setval)\b", re.IGNORECASE
+)
+
+_scopes = threading.local()
+
+@contextmanager
+def statement_scope(name: str):
+    """Name the statements executed in this block (usable as a decorator)"""
+    stack = getattr(_scopes, "stack", None)
+    if stack is None:
+        stack = _scopes.stack = []
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+@lru_cache(maxsize=1024)
+def describe_statement(sql: str) -> str:
+    """Verb and main table, e.g. "SELECT mgnrega_monthly" """
+    verb = _VERB.match(sql)
+    # The first table named outside parentheses, skipping subqueries and
+    # expressions such as EXTRACT(EPOCH FROM ...)
+    table = next(
+        (match.group(1) for match in _TABLE.finditer(sql)
+         if sql.count("(", 0, match.start()) == sql.count(")", 0, match.start())),
+        None
+    )
+    return " ".join(filter(None, (
+        verb.group(1).upper() if verb else None, table
+    ))) or "statement"
+
+def statement_name(sql: str) -> str:
+    """Enclosing scopes plus the statement's verb and main table"""
+    description = describe_statement(sql)
+    stack = getattr(_scopes, "stack", None)
+    return f"{'.'.join(stack)}: {description}" if stack else description
+
+def explain_statement(sql: str) -> Optional[str]:
+    """
+    The EXPLAIN to run for a statement: ANALYZE for reads, a plain plan for
+    writes, None where EXPLAIN does not apply (DDL, COPY, utility commands)
+    """
+    verb = _VERB.match(sql)
+    verb = verb.group(1).upper() if verb else ""
+    if verb in ("SELECT", "WITH", "VALUES") and not _WRITES.search(sql):
+        return "EXPLAIN (ANALYZE, BUFFERS) "
+    if verb in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE"):
+        return "EXPLAIN "
+    return None
+
+class QueryTracer:
+    """Ring buffer of slow statements with sampled plan capture"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS,
+                 sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE,
+                 explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL,
+                 size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.explain_interval = explain_interval
+        self.entries: deque = deque(maxlen=size)
+        self.slow_total = 0
+        self._last_explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, cursor, sql, params, seconds: float, error: Optional[str] = None):
+        """Account for one executed statement; never raises into the caller"""
+        try:
+            self._record(cursor, sql, params, seconds, error)
+        except Exception:
+            logger.exception("Statement tracing failed")
+
+    def _record(self, cursor, sql, params, seconds: float, error: Optional[str]):
+        if not isinstance(sql, str):
+            sql = sql.decode() if isinstance(sql, bytes) else sql.as_string(cursor.connection)
+        name = statement_name(sql)
+        DB_STATEMENT_SECONDS.observe(seconds, name)
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        plan = None
+        if error is None and cursor.name is None and self._should_explain(name):
+            plan = self._explain(cursor.connection, sql, params)
+
+        entry = {
+            "name": name,
+            "duration_ms": round(duration_ms, 2),
+            "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "sql": sql.strip()[:MAX_SQL_LENGTH],
+            "error": error,
+            "plan": plan,
+        }
+        with self._lock:
+            self.entries.append(entry)
+            self.slow_total += 1
+        logger.warning(
+            f"Slow statement {name} took {duration_ms:.0f}ms"
+            + (f"\n{plan}" if plan else "")
+        )
+
+    def _should_explain(self, name: str) -> bool:
+        if random.random() >= self.sample_rate:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explained.get(name, float("-inf")) < self.explain_interval:
+                return False
+            self._last_explained[name] = now
+            return True
+
+    def _explain(self, conn, sql: str, params) -> Optional[str]:
+        prefix = explain_statement(sql)
+        status = conn.get_transaction_status()
+        if prefix is None or status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return None
+
+        # A savepoint keeps a failing EXPLAIN from aborting the caller's
+        # transaction and undoes anything EXPLAIN ANALYZE did
+        savepoint = status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        cur = psycopg2.extensions.cursor(conn)
+        try:
+            if savepoint:
+                cur.execute("SAVEPOINT query_trace")
+            try:
+                cur.execute(prefix + sql, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+            except psycopg2.Error as e:
+                plan = f"EXPLAIN failed: {e}".strip()
+                if savepoint:
+                    cur.execute("ROLLBACK TO SAVEPOINT query_trace")
+            if savepoint:
+                cur.execute("RELEASE SAVEPOINT query_trace")
+            return plan
+        except psycopg2.Error as e:
+            logger.error(f"Could not capture plan: {e}")
+            return None
+        finally:
+            cur.close()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            entries = list(self.entries)
+            slow_total = self.slow_total
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.sample_rate,
+            "explain_interval_s": self.explain_interval,
+            "slow_total": slow_total,
+            "entries": entries[::-1],
+        }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._last_explained.clear()
+
+tracer = QueryTracer()
+
+_cursor_classes: Dict[type, type] = {}
+
+def _tracing_cursor_class(base: type) -> type:
+    """Subclass of a cursor class whose execute is timed and traced"""
+    cls = _cursor_classes.get(base)
+    if cls is None:
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            try:
+                result = base.execute(self, query, vars)
+            except Exception as e:
+                tracer.record(self, query, vars, time.perf_counter() - started, str(e).strip())
+                raise
+            tracer.record(self, query, vars, time.perf_counter() - started)
+            return result
+
+        cls = _cursor_classes[base] = type(f"Tracing{base.__name__}", (base,), {"execute": execute})
+    return cls
+
+class TracingConnection(psycopg2.extensions.connection):
+    """psycopg2 connection (pass as connection_factory) whose cursors are traced"""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _tracing_cursor_class(base)
+        return super().cursor(*args, **kwargs)
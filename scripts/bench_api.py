@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Measure API throughput and latency at increasing client concurrency
+Usage: python bench_api.py [--url http://localhost:8000] [--levels 1,8,32] [--output results.json] [--compare baseline.json]
+
+Each concurrency level runs for a fixed duration with that many client
+threads cycling through the read endpoints: the district list, current
+and trend data for a random district, and district detection for a random
+point in India. Requests/second and p50/p95/p99 latency are reported per
+endpoint, with the API's cache hit ratio over the level (from /cache/stats):
+once warm, most district reads are served from the response cache, so a
+high hit ratio means the latencies measure the cache rather than the
+database. Responses other than 200/204 count as errors. With the
+database calls offloaded from the event loop,
+requests/second should grow with concurrency until the DB pool
+(DB_POOL_MAX) is saturated.
+
+Use seed_synthetic_dataset.py for a national-scale dataset. --output saves
+the results with the git commit they were measured at, and --compare
+prints the change against such a file from an earlier commit.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+import requests
+
+# Longitude/latitude bounds detection points are drawn from
+INDIA_BOUNDS = (68.5, 8.0, 97.0, 35.5)
+PERCENTILES = (50, 95, 99)
+OK_STATUSES = (200, 204)
+# /cache/stats sections reported per level: the response cache (at the top
+# level) and the /detect-district point cache
+CACHES = {"response": None, "detect_district": "detect_district"}
+
+Request = Tuple[str, str, Optional[Dict]]
+Target = Tuple[str, Callable[[random.Random], Request]]
+
+def build_targets(base_url: str, district_ids: List[int]) -> List[Target]:
+    """(endpoint name, request factory) for each endpoint under test"""
+    min_lon, min_lat, max_lon, max_lat = INDIA_BOUNDS
+    return [
+        ("districts", lambda rng: ("GET", f"{base_url}/districts", None)),
+        ("current", lambda rng: (
+            "GET", f"{base_url}/district/{rng.choice(district_ids)}/current", None
+        )),
+        ("trends", lambda rng: (
+            "GET", f"{base_url}/district/{rng.choice(district_ids)}/trends", None
+        )),
+        ("detect-district", lambda rng: ("POST", f"{base_url}/detect-district", {
+            "latitude": round(rng.uniform(min_lat, max_lat), 6),
+            "longitude": round(rng.uniform(min_lon, max_lon), 6),
+        })),
+    ]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(1, -(-len(samples) * pct // 100))
+    return samples[int(rank) - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 2)
+    return summary
+
+def run_level(targets, concurrency: int, duration: float, seed: int) -> Dict:
+    """
+    Run `concurrency` client threads for `duration` seconds; returns
+    per-endpoint and overall summaries of the successful requests.
+    """
+    deadline = time.perf_counter() + duration
+    # One list per thread and endpoint, so recording needs no lock
+    latencies = [[[] for _ in targets] for _ in range(concurrency)]
+    errors = [[0] * len(targets) for _ in range(concurrency)]
+
+    def client(idx: int):
+        session = requests.Session()
+        rng = random.Random(seed * 1000 + idx)
+        i = idx
+        while time.perf_counter() < deadline:
+            target = i % len(targets)
+            method, url, body = targets[target][1](rng)
+            i += 1
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, json=body, timeout=30)
+                if response.status_code in OK_STATUSES:
+                    latencies[idx][target].append(time.perf_counter() - started)
+                else:
+                    errors[idx][target] += 1
+            except requests.exceptions.RequestException:
+                errors[idx][target] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for target, (name, _) in enumerate(targets):
+        endpoints[name] = summarize(
+            [sample for thread in latencies for sample in thread[target]],
+            sum(thread[target] for thread in errors), elapsed
+        )
+    endpoints["all"] = summarize(
+        [sample for thread in latencies for samples in thread for sample in samples],
+        sum(map(sum, errors)), elapsed
+    )
+    return {"clients": concurrency, "elapsed_s": round(elapsed, 2), "endpoints": endpoints}
+
+def fetch_cache_stats(base_url: str) -> Optional[Dict[str, Tuple[int, int]]]:
+    """(hits, misses) per cache, or None when the API has no /cache/stats"""
+    try:
+        response = requests.get(f"{base_url}/cache/stats", timeout=30)
+        response.raise_for_status()
+        stats = response.json()
+        return {
+            name: ((stats[section] if section else stats)["hits"],
+                   (stats[section] if section else stats)["misses"])
+            for name, section in CACHES.items()
+        }
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+        return None
+
+def cache_hit_ratios(before, after) -> Optional[Dict[str, Optional[float]]]:
+    """Hit ratio of each cache over the lookups made between two snapshots"""
+    if before is None or after is None:
+        return None
+    ratios = {}
+    for name in CACHES:
+        hits = after[name][0] - before[name][0]
+        lookups = hits + after[name][1] - before[name][1]
+        ratios[name] = round(hits / lookups, 3) if lookups > 0 else None
+    return ratios
+
+def fetch_district_ids(base_url: str) -> List[int]:
+    response = requests.get(f"{base_url}/districts", timeout=30)
+    response.raise_for_status()
+    return [district["id"] for district in response.json()]
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_level(level: Dict):
+    print(f"\n{level['clients']} clients, {level['elapsed_s']:.1f}s")
+    print(f"{'endpoint':<18}{'requests':>10}{'errors':>8}{'req/s':>10}"
+          + "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES))
+    for name, s in level["endpoints"].items():
+        print(f"{name:<18}{s['requests']:>10}{s['errors']:>8}{s['rps']:>10.1f}"
+              + "".join(f"{s[f'p{pct}_ms']:>10.2f}" for pct in PERCENTILES))
+    ratios = level.get("cache_hit_ratio")
+    if ratios:
+        print("cache hit ratio: " + ", ".join(
+            f"{name} {'-' if ratio is None else f'{ratio:.0%}'}" for name, ratio in ratios.items()
+        ))
+
+def change(new: float, old: float) -> str:
+    return f"{(new - old) / old:+.0%}" if old else "-"
+
+def print_comparison(results: Dict, baseline: Dict):
+    """req/s and p95 of each endpoint against the same level in `baseline`"""
+    print(f"\nCompared with {baseline.get('git_commit') or 'baseline'} "
+          f"({baseline.get('timestamp', '?')})")
+    print(f"{'clients':>8} {'endpoint':<18}{'req/s':>10}{'change':>8}{'p95 ms':>10}{'change':>8}")
+    previous = {level["clients"]: level["endpoints"] for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        old_endpoints = previous.get(level["clients"])
+        if old_endpoints is None:
+            continue
+        for name, s in level["endpoints"].items():
+            old = old_endpoints.get(name)
+            if old is None:
+                continue
+            print(f"{level['clients']:>8} {name:<18}{s['rps']:>10.1f}{change(s['rps'], old['rps']):>8}"
+                  f"{s['p95_ms']:>10.2f}{change(s['p95_ms'], old['p95_ms']):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--district-id", type=int, action="append",
+                        help="District to query (repeatable); default: every district")
+    parser.add_argument("--levels", default="1,2,4,8,16,32",
+                        help="Comma-separated client concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds to run each level")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    district_ids = args.district_id or fetch_district_ids(base_url)
+    if not district_ids:
+        parser.error("no districts to query; seed the database first")
+    targets = build_targets(base_url, district_ids)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "url": base_url,
+        "config": {
+            "duration_s": args.duration,
+            "districts": len(district_ids),
+            "seed": args.seed,
+        },
+        "levels": [],
+    }
+
+    baseline = None
+    for clients in [int(x) for x in args.levels.split(",")]:
+        before = fetch_cache_stats(base_url)
+        level = run_level(targets, clients, args.duration, args.seed)
+        level["cache_hit_ratio"] = cache_hit_ratios(before, fetch_cache_stats(base_url))
+        rps = level["endpoints"]["all"]["rps"]
+        if baseline is None:
+            baseline = rps or 1.0
+        level["scaling"] = round(rps / baseline, 2)
+        results["levels"].append(level)
+        print_level(level)
+        print(f"scaling vs {results['levels'][0]['clients']} client(s): {level['scaling']:.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
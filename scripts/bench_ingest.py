@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Measure end-to-end ingestion throughput against a local mock data.gov.in
+Usage: python bench_ingest.py [--states 3] [--districts 75] [--latency-ms 50] [--throttle-every 20] [--bad-ratio 0.01] [--output results.json]
+
+Starts mock_datagov_server.py in-process (or uses --url), points the
+ingestion module at it and runs fetch_and_store for each benchmark state
+against the configured DATABASE_URL. Reports records/second and where the
+time went: waiting for pages, normalizing, storing and refreshing derived
+tables, plus what rate limiting and retries cost.
+
+Benchmark states are named BENCH STATE NN; their rows are deleted first
+so every run is a full load, unless --incremental is given.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+
+# Add parent directory to path to import from backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mock_datagov_server import add_config_arguments, config_from_args, start_server
+from bench_api import git_commit
+
+STAGES = ("fetch", "normalize", "store", "refresh")
+STATE_TABLES = (
+    "mgnrega_raw", "mgnrega_monthly", "state_monthly_averages", "district_latest",
+    "state_snapshot_metadata",
+)
+
+def reset_states(database_url: str, states):
+    conn = psycopg2.connect(database_url)
+    try:
+        cur = conn.cursor()
+        for table in STATE_TABLES:
+            cur.execute(f"DELETE FROM {table} WHERE state_name = ANY(%s)", (list(states),))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--states", type=int, default=3)
+    parser.add_argument("--url", help="Base URL of an already running mock server")
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="Requests/second allowed by the client token bucket")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages fetched ahead")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep existing rows, measuring an incremental re-run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = start_server(config_from_args(args))
+        base_url = f"http://127.0.0.1:{server.server_port}/resource"
+
+    # The ingestion module reads its settings from the environment on import
+    os.environ["DATAGOV_BASE_URL"] = base_url
+    os.environ["INGEST_CONCURRENCY"] = str(args.concurrency)
+    os.environ["DATAGOV_KEY"] = args.api_key or "bench"
+    os.environ["DATAGOV_RESOURCE_ID"] = "mgnrega-bench"
+    from app.db import init_db
+    from app import ingest
+
+    init_db()
+    states = [f"BENCH STATE {n:02d}" for n in range(1, args.states + 1)]
+    if not args.incremental:
+        reset_states(ingest.DATABASE_URL, states)
+
+    runs = []
+    started = time.perf_counter()
+    for state in states:
+        result = ingest.fetch_and_store(state, rate=args.rate)
+        runs.append({"state": state, **result})
+    elapsed = time.perf_counter() - started
+
+    totals = {
+        name: sum(run[name] for run in runs)
+        for name in ("records", "rejected", "inserted", "updated", "unchanged")
+    }
+    timings = {
+        f"{stage}_s": round(sum(run["timings"].get(f"{stage}_s", 0.0) for run in runs), 3)
+        for stage in STAGES
+    }
+    fetch = {
+        name: round(sum(run["fetch"][name] for run in runs), 3)
+        for name in runs[0]["fetch"]
+    } if runs else {}
+
+    print(f"\n{'state':<18}{'records':>9}{'rejected':>10}{'rec/s':>9}"
+          + "".join(f"{stage:>11}" for stage in STAGES) + f"{'429s':>6}{'retries':>9}")
+    for run in runs:
+        t = run["timings"]
+        print(f"{run['state']:<18}{run['records']:>9}{run['rejected']:>10}"
+              f"{run['records'] / t['total_s'] if t['total_s'] else 0:>9.0f}"
+              + "".join(f"{t.get(f'{stage}_s', 0.0):>10.2f}s" for stage in STAGES)
+              + f"{run['fetch']['rate_limited']:>6}{run['fetch']['retries']:>9}")
+
+    print(f"\n{totals['records']} records ({totals['rejected']} rejected) in {elapsed:.1f}s: "
+          f"{totals['records'] / elapsed:.0f} records/s")
+    for stage in STAGES:
+        share = timings[f"{stage}_s"] / elapsed if elapsed else 0
+        print(f"  {stage:<10}{timings[f'{stage}_s']:>9.2f}s {share:>5.0%}")
+    print(f"  429 responses: {fetch.get('rate_limited', 0)} "
+          f"({fetch.get('rate_limited_pause_s', 0)}s paused), "
+          f"retries: {fetch.get('retries', 0)} ({fetch.get('retry_delay_s', 0)}s backoff), "
+          f"throttle wait: {fetch.get('throttle_wait_s', 0)}s")
+    if server is not None:
+        print(f"  mock server: {server.stats()}")
+
+    if args.output:
+        results = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "config": {
+                name: value for name, value in vars(args).items()
+                if name not in ("output", "api_key")
+            },
+            "elapsed_s": round(elapsed, 3),
+            "records_per_s": round(totals["records"] / elapsed, 1) if elapsed else 0.0,
+            **totals,
+            "timings": timings,
+            "fetch": fetch,
+            "states": runs,
+        }
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if server is not None:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Measure ingestion normalization throughput on synthetic data.gov.in pages
+Usage: python bench_normalize.py [--pages 500,5000,50000] [--bad-ratio 0.01] [--repeat 5]
+
+Records use the alias field names and string-encoded numbers the API
+returns; a fraction of them carry unparseable values so the rejected-row
+path is exercised too.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path to import from backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.ingest import normalize_page
+
+def synthetic_page(size: int, bad_ratio: float, seed: int = 0):
+    rng = random.Random(seed)
+    page = []
+    for i in range(size):
+        record = {
+            "state_name": "UTTAR PRADESH",
+            "district_name": f"DISTRICT {i % 75}",
+            "state_code": "31",
+            "district_code": str(3100 + i % 75),
+            "fin_year": "2023-2024",
+            "year": str(2015 + i % 10),
+            "month": str(1 + i % 12),
+            "person_days": f"{rng.uniform(1e3, 1e6):.2f}",
+            "households": str(rng.randint(100, 50000)),
+            "average_days_of_employment_provided_per_household": str(rng.randint(1, 100)),
+            "total_exp_rs__in_lakhs__": f"{rng.uniform(1, 5000):.2f}",
+            "women_person_days": f"{rng.uniform(1e2, 5e5):.2f}",
+            "Total_No_of_Active_Job_Cards": str(rng.randint(1000, 900000)),
+            "Number_of_Ongoing_Works": str(rng.randint(10, 9000)),
+            "Remarks": "NA",
+        }
+        if rng.random() < bad_ratio:
+            record["person_days"] = "NA"
+        page.append(record)
+    return page
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", default="500,5000,50000",
+                        help="Comma-separated page sizes")
+    parser.add_argument("--bad-ratio", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page size':>10}{'records/s':>14}{'ms/page':>10}{'rejected':>10}")
+    for size in [int(size) for size in args.pages.split(",")]:
+        page = synthetic_page(size, args.bad_ratio)
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            _, rejected = normalize_page(page)
+            best = min(best, time.perf_counter() - started)
+        print(f"{size:>10}{size / best:>14,.0f}{best * 1000:>10.1f}{len(rejected):>10}")
+
+if __name__ == "__main__":
+    main()
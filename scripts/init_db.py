@@ -11,13 +11,16 @@ import json
 # Add parent directory to path to import from backend
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app.db import get_db, return_db, init_db
+from app.db import get_db, return_db, init_db, backfill_district_ids, mark_boundaries_updated
 
 def load_sample_districts():
     """Load sample districts for Uttar Pradesh (you'll need to replace with actual GeoJSON data)"""
     conn = get_db()
     try:
         cur = conn.cursor()
+        # The metric backfill below can rewrite large tables;
+        # DB_STATEMENT_TIMEOUT_MS is meant for request queries
+        cur.execute("SET LOCAL statement_timeout = 0")
         
         # Sample districts - in production, load from GeoJSON file
         # You can get district boundaries from:
@@ -39,6 +42,7 @@ def load_sample_districts():
         
         # For now, insert districts without geometry
         # You'll need to update with actual geometry later
+        inserted = 0
         for district in sample_districts:
             cur.execute("""
                 INSERT INTO districts (state_name, district_name, state_code, district_code)
@@ -50,9 +54,17 @@ def load_sample_districts():
                 district.get("state_code"),
                 district.get("district_code")
             ))
+            inserted += cur.rowcount
+        
+        # Link already-ingested metrics to the new district rows
+        linked = backfill_district_ids(cur)
+        # The API caches district lists and per-district answers
+        if inserted or linked:
+            mark_boundaries_updated(cur)
         
         conn.commit()
         print(f"Loaded {len(sample_districts)} sample districts")
+        print(f"Linked {linked} metric rows to districts")
         cur.close()
         
     except Exception as e:
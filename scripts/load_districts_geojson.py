@@ -1,77 +1,305 @@
 #!/usr/bin/env python3
 """
 Load district boundaries from GeoJSON file
-Usage: python load_districts_geojson.py <path_to_geojson_file>
+Usage: python load_districts_geojson.py <path_to_geojson_file> [--batch-size 50] [--workers 4]
+
+Accepts a FeatureCollection (.geojson/.json) or GeoJSON text sequences
+with one feature per line (.geojsonl/.geojsons/.ndjson). Features are
+streamed, so memory stays flat whatever the file size. Batches are copied
+into a staging table, and then geometries are repaired (ST_MakeValid, coerced to
+MultiPolygon) on several connections in parallel. Loading is idempotent:
+a district that already exists (same state and district name) has its
+boundary replaced instead of being inserted again.
 """
+import argparse
+import io
 import os
 import sys
 import json
-import psycopg2
-from psycopg2.extras import Json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import ijson
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app.db import get_db, return_db
+from app.db import (
+    get_db, return_db, backfill_district_ids, mark_boundaries_updated, refresh_district_geometries
+)
+
+SEQUENCE_SUFFIXES = ('.geojsonl', '.geojsons', '.ndjson', '.jsonl')
+STAGING_COLUMNS = ("state_name", "district_name", "state_code", "district_code", "geojson")
+
+def iter_features(stream, sequence: bool) -> Iterator[Dict]:
+    """Yield features one at a time from a FeatureCollection or a GeoJSON sequence"""
+    if sequence:
+        for line in stream:
+            # RFC 8142 sequences prefix each record with a record separator
+            line = line.strip().lstrip(b'\x1e')
+            if line:
+                yield json.loads(line)
+    else:
+        yield from ijson.items(stream, 'features.item', use_float=True)
+
+def feature_row(feature: Dict) -> Optional[Tuple]:
+    """Staging row for a feature, or None when it lacks a geometry or names"""
+    props = feature.get('properties') or {}
+    geometry = feature.get('geometry')
+
+    if not geometry:
+        return None
+
+    # Extract district info from properties
+    # Adjust these field names based on your GeoJSON structure
+    state_name = props.get('state_name') or props.get('STATE') or props.get('State')
+    district_name = props.get('district_name') or props.get('DISTRICT') or props.get('District')
+
+    if not state_name or not district_name:
+        return None
+
+    return (
+        state_name,
+        district_name,
+        props.get('state_code'),
+        props.get('district_code'),
+        json.dumps(geometry),
+    )
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def load_batch(rows: List[Tuple]) -> Dict[str, int]:
+    """
+    Repair and upsert one batch on its own pooled connection.
 
-def load_geojson(file_path: str):
-    """Load districts from GeoJSON file and insert into database"""
-    with open(file_path, 'r') as f:
-        geojson = json.load(f)
-    
+    Parsing and repair run concurrently across batches; the upsert itself
+    takes an advisory lock so that two batches holding the same district
+    cannot both insert it.
+    """
     conn = get_db()
     try:
         cur = conn.cursor()
-        
-        features = geojson.get('features', [])
-        count = 0
-        
-        for feature in features:
-            props = feature.get('properties', {})
-            geometry = feature.get('geometry')
-            
-            if not geometry:
-                continue
-            
-            # Extract district info from properties
-            # Adjust these field names based on your GeoJSON structure
-            state_name = props.get('state_name') or props.get('STATE') or props.get('State')
-            district_name = props.get('district_name') or props.get('DISTRICT') or props.get('District')
-            
-            if not state_name or not district_name:
-                continue
-            
-            # Convert GeoJSON geometry to PostGIS format
-            geometry_json = Json(geometry)
-            
-            cur.execute("""
-                INSERT INTO districts (state_name, district_name, geom)
-                VALUES (%s, %s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326))
-                ON CONFLICT DO NOTHING
-            """, (state_name, district_name, json.dumps(geometry)))
-            
-            count += 1
-        
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS district_staging (
+                seq SERIAL,
+                state_name TEXT,
+                district_name TEXT,
+                state_code TEXT,
+                district_code TEXT,
+                geojson TEXT,
+                geom GEOMETRY(MULTIPOLYGON, 4326),
+                repaired BOOLEAN DEFAULT false
+            ) ON COMMIT DELETE ROWS
+        """)
+
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(_copy_value(value) for value in row))
+            buf.write("\n")
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY district_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN", buf
+        )
+
+        # Parse, repair invalid shapes and keep only the polygonal parts
+        cur.execute("""
+            UPDATE district_staging s
+            SET geom = ST_Multi(ST_CollectionExtract(
+                    CASE WHEN g.valid THEN g.geom ELSE ST_MakeValid(g.geom) END, 3
+                )),
+                repaired = NOT g.valid
+            FROM (
+                SELECT seq, geom, ST_IsValid(geom) AS valid
+                FROM (
+                    SELECT seq, ST_SetSRID(ST_GeomFromGeoJSON(geojson), 4326) AS geom
+                    FROM district_staging
+                ) parsed
+            ) g
+            WHERE g.seq = s.seq
+        """)
+        cur.execute("""
+            DELETE FROM district_staging WHERE geom IS NULL OR ST_IsEmpty(geom)
+        """)
+        rejected = cur.rowcount
+
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('districts_upsert'))")
+
+        # The last feature for a district wins; an existing district keeps
+        # its id (the lowest one if the name pair is duplicated)
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS district_upsert ON COMMIT DROP AS
+            SELECT DISTINCT ON (state_name, district_name)
+                   state_name, district_name, state_code, district_code, geom, repaired
+            FROM district_staging
+            ORDER BY state_name, district_name, seq DESC
+        """)
+        cur.execute("""
+            UPDATE districts d
+            SET geom = u.geom,
+                state_code = COALESCE(u.state_code, d.state_code),
+                district_code = COALESCE(u.district_code, d.district_code)
+            FROM district_upsert u
+            WHERE d.id = (
+                SELECT MIN(id) FROM districts
+                WHERE state_name = u.state_name AND district_name = u.district_name
+            )
+            RETURNING d.id
+        """)
+        ids = [row[0] for row in cur.fetchall()]
+        updated = len(ids)
+        cur.execute("""
+            INSERT INTO districts (state_name, district_name, state_code, district_code, geom)
+            SELECT u.state_name, u.district_name, u.state_code, u.district_code, u.geom
+            FROM district_upsert u
+            WHERE NOT EXISTS (
+                SELECT 1 FROM districts d
+                WHERE d.state_name = u.state_name AND d.district_name = u.district_name
+            )
+            RETURNING id
+        """)
+        inserted_ids = [row[0] for row in cur.fetchall()]
+        ids.extend(inserted_ids)
+        cur.execute("SELECT COUNT(*) FILTER (WHERE repaired) FROM district_upsert")
+        repaired = cur.fetchone()[0]
+
+        # Simplified tile geometries and bounding boxes for these rows
+        refresh_district_geometries(cur, ids)
+        # Still under the advisory lock, so versions advance in commit order
+        if ids:
+            mark_boundaries_updated(cur)
+
         conn.commit()
-        print(f"Loaded {count} districts from GeoJSON")
         cur.close()
-        
-    except Exception as e:
+        return {
+            "inserted": len(inserted_ids),
+            "updated": updated,
+            "repaired": repaired,
+            "rejected": rejected,
+        }
+    except Exception:
         conn.rollback()
-        print(f"Error loading GeoJSON: {e}")
         raise
     finally:
         return_db(conn)
 
+class Progress:
+    """Thread-safe counters with a periodic throughput line"""
+
+    def __init__(self, total_bytes: int, interval: float = 2.0):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.counts = {"features": 0, "skipped": 0, "inserted": 0, "updated": 0,
+                       "repaired": 0, "rejected": 0}
+        self.started = time.perf_counter()
+        self._reported = self.started
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def report(self, position: int, final: bool = False):
+        now = time.perf_counter()
+        if not final and now - self._reported < self.interval:
+            return
+        self._reported = now
+        elapsed = max(now - self.started, 1e-9)
+        c = self.counts
+        percent = f"{position / self.total_bytes:.0%}" if self.total_bytes else "-"
+        print(
+            f"{'Done' if final else 'Progress'}: {c['features']} features ({percent}), "
+            f"{c['inserted']} inserted, {c['updated']} updated, {c['repaired']} repaired, "
+            f"{c['rejected'] + c['skipped']} rejected | "
+            f"{c['features'] / elapsed:.0f} features/s, "
+            f"{position / elapsed / (1024 * 1024):.1f} MB/s",
+            flush=True
+        )
+
+def load_geojson(file_path: str, batch_size: int = 50, workers: int = 4):
+    """Stream districts from a GeoJSON file into the database"""
+    sequence = file_path.lower().endswith(SEQUENCE_SUFFIXES)
+    progress = Progress(os.path.getsize(file_path))
+    # Bounds the batches held in memory to those being loaded
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    errors = []
+
+    def run(rows):
+        try:
+            progress.add(**load_batch(rows))
+        except Exception as e:
+            errors.append(e)
+            raise
+        finally:
+            slots.release()
+
+    futures = []
+    with open(file_path, 'rb') as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        batch: List[Tuple] = []
+        for feature in iter_features(f, sequence):
+            if errors:
+                break
+            row = feature_row(feature)
+            if row is None:
+                progress.add(features=1, skipped=1)
+                continue
+            batch.append(row)
+            progress.add(features=1)
+            if len(batch) >= batch_size:
+                slots.acquire()
+                futures.append(pool.submit(run, batch))
+                batch = []
+            progress.report(f.tell())
+
+        if batch and not errors:
+            slots.acquire()
+            futures.append(pool.submit(run, batch))
+
+        # Surface the first failed batch; the others have committed
+        for future in futures:
+            future.result()
+        progress.report(f.tell(), final=True)
+
+    # Link already-ingested metrics to the new district rows
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        # Rewrites every unlinked metric row; DB_STATEMENT_TIMEOUT_MS is
+        # meant for request queries
+        cur.execute("SET LOCAL statement_timeout = 0")
+        linked = backfill_district_ids(cur)
+        # /current and /trends may have cached empty answers for the new
+        # districts before their metrics were linked
+        if linked:
+            mark_boundaries_updated(cur)
+        conn.commit()
+        cur.close()
+    finally:
+        return_db(conn)
+    print(f"Linked {linked} metric rows to districts")
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python load_districts_geojson.py <path_to_geojson_file>")
-        sys.exit(1)
-    
-    geojson_path = sys.argv[1]
-    if not os.path.exists(geojson_path):
-        print(f"Error: File not found: {geojson_path}")
+    parser = argparse.ArgumentParser(description="Load district boundaries from GeoJSON")
+    parser.add_argument("path", help="FeatureCollection or GeoJSON sequence file")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Features per insert batch")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Batches repaired and loaded in parallel")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: File not found: {args.path}")
         sys.exit(1)
-    
-    load_geojson(geojson_path)
 
+    load_geojson(args.path, args.batch_size, args.workers)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the data.gov.in resource API serving synthetic MGNREGA records
+Usage: python mock_datagov_server.py [--port 8765] [--districts 75] [--years 10] [--latency-ms 50] [--throttle-every 20] [--bad-ratio 0.01]
+
+Point ingestion at it with DATAGOV_BASE_URL=http://localhost:8765/resource
+(any DATAGOV_KEY and DATAGOV_RESOURCE_ID are accepted unless --api-key is
+given). Every state name asked for through filters[state_name] gets its
+own deterministic set of districts, so INGEST_STATES can list anything.
+
+The API's behaviour under load can be imitated: per-request latency, a cap
+on the page size, HTTP 429 with Retry-After every Nth request, transient
+HTTP 503 errors, and a fraction of malformed records (non-numeric
+values, missing names, impossible months).
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_STATES = ("BENCH STATE 01",)
+
+def synthetic_records(state: str, district: str, state_code: str, district_code: str,
+                      years: range, rng: random.Random) -> List[Dict]:
+    """Monthly records in the data.gov.in shape, with seasonality and growth"""
+    households_base = rng.lognormvariate(9.5, 0.6)
+    days_base = rng.uniform(25, 60)
+    wage_rate = rng.uniform(200, 330)  # rupees per person-day
+    women_share = rng.uniform(0.3, 0.75)
+    records = []
+    for year_index, year in enumerate(years):
+        growth = 1 + 0.03 * year_index
+        for month in range(1, 13):
+            # Demand peaks before the monsoon (April to June)
+            season = 1 + 0.45 * math.cos((month - 5) / 12 * 2 * math.pi)
+            households = max(1, int(households_base * growth * season * rng.uniform(0.85, 1.15)))
+            days = max(1.0, days_base * season * rng.uniform(0.8, 1.2) / 2)
+            persondays = households * days
+            records.append({
+                "state_name": state,
+                "district_name": district,
+                "state_code": state_code,
+                "district_code": district_code,
+                "fin_year": f"{year}-{year + 1}",
+                "year": str(year),
+                "month": str(month),
+                "person_days": f"{persondays:.2f}",
+                "households": str(households),
+                "average_days_of_employment_provided_per_household": f"{days:.2f}",
+                "total_exp_rs__in_lakhs__": f"{persondays * wage_rate / 1e5:.2f}",
+                "women_person_days": f"{persondays * women_share:.2f}",
+            })
+    return records
+
+class MockConfig:
+    def __init__(self, districts: int = 75, years: int = 10,
+                 end_year: int = datetime.now().year - 1,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 max_page_size: int = 1000, throttle_every: int = 0,
+                 retry_after: float = 1.0, error_every: int = 0,
+                 bad_ratio: float = 0.0, api_key: Optional[str] = None, seed: int = 42):
+        self.districts = districts
+        self.years = range(end_year - years + 1, end_year + 1)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_page_size = max_page_size
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.error_every = error_every
+        self.bad_ratio = bad_ratio
+        self.api_key = api_key
+        self.seed = seed
+
+class MockDataGovServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: MockConfig):
+        super().__init__(address, MockDataGovHandler)
+        self.config = config
+        self.counts = {"requests": 0, "served": 0, "records": 0, "throttled": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self.state_records = lru_cache(maxsize=64)(self._state_records)
+
+    def _state_records(self, state: str) -> List[Dict]:
+        """Every record of a state, the same on every call"""
+        config = self.config
+        state_code = str(zlib.crc32(state.encode("utf-8")) % 90 + 10)
+        records = []
+        for n in range(1, config.districts + 1):
+            district = f"{state} DISTRICT {n:03d}"
+            records.extend(synthetic_records(
+                state, district, state_code, f"{state_code}{n:03d}", config.years,
+                random.Random(f"{config.seed}:{state}:{n}")
+            ))
+        rng = random.Random(f"{config.seed}:{state}:bad")
+        for record in records:
+            if rng.random() < config.bad_ratio:
+                corruption = rng.randrange(3)
+                if corruption == 0:
+                    record["person_days"] = "NA"
+                elif corruption == 1:
+                    record["district_name"] = ""
+                else:
+                    record["month"] = "13"
+        return records
+
+    def next_request(self) -> Optional[int]:
+        """Count a request; returns the error status to answer with, if any"""
+        config = self.config
+        with self._lock:
+            self.counts["requests"] += 1
+            n = self.counts["requests"]
+            if config.throttle_every and n % config.throttle_every == 0:
+                self.counts["throttled"] += 1
+                return 429
+            if config.error_every and n % config.error_every == 0:
+                self.counts["errors"] += 1
+                return 503
+            return None
+
+    def record_served(self, records: int):
+        with self._lock:
+            self.counts["served"] += 1
+            self.counts["records"] += records
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+class MockDataGovHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server: MockDataGovServer = self.server
+        config = server.config
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        if not url.path.startswith("/resource/"):
+            self.send_json(404, {"status": "error", "message": "Not found"})
+            return
+        if config.api_key and query.get("api-key") != config.api_key:
+            self.send_json(403, {"status": "error", "message": "Invalid API key"})
+            return
+
+        if config.latency_ms or config.jitter_ms:
+            time.sleep((config.latency_ms + random.uniform(0, config.jitter_ms)) / 1000)
+
+        status = server.next_request()
+        if status == 429:
+            self.send_json(429, {"status": "error", "message": "Rate limit exceeded"},
+                           {"Retry-After": f"{config.retry_after:g}"})
+            return
+        if status is not None:
+            self.send_json(status, {"status": "error", "message": "Service unavailable"})
+            return
+
+        try:
+            limit = min(int(query.get("limit", 10)), config.max_page_size)
+            offset = int(query.get("offset", 0))
+        except ValueError:
+            self.send_json(400, {"status": "error", "message": "Invalid limit or offset"})
+            return
+
+        filters = {
+            name[len("filters["):-1]: value
+            for name, value in query.items()
+            if name.startswith("filters[") and name.endswith("]")
+        }
+        states = [filters.pop("state_name")] if "state_name" in filters else DEFAULT_STATES
+        records = [record for state in states for record in server.state_records(state)]
+        if filters:
+            records = [
+                record for record in records
+                if all(str(record.get(field)) == value for field, value in filters.items())
+            ]
+
+        page = records[offset:offset + limit]
+        server.record_served(len(page))
+        self.send_json(200, {
+            "status": "ok",
+            "title": "Synthetic MGNREGA district-wise monthly data",
+            "total": len(records),
+            "count": len(page),
+            "limit": str(limit),
+            "offset": str(offset),
+            "records": page,
+        })
+
+def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> MockDataGovServer:
+    """Serve in a background thread; port 0 picks a free port"""
+    server = MockDataGovServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--districts", type=int, default=75, help="Districts per state")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--end-year", type=int, default=datetime.now().year - 1)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency")
+    parser.add_argument("--max-page-size", type=int, default=1000,
+                        help="Largest limit honoured; larger requests get a short page")
+    parser.add_argument("--throttle-every", type=int, default=0,
+                        help="Answer every Nth request with 429 (0 disables)")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After seconds sent with a 429")
+    parser.add_argument("--error-every", type=int, default=0,
+                        help="Answer every Nth request with 503 (0 disables)")
+    parser.add_argument("--bad-ratio", type=float, default=0.0,
+                        help="Fraction of malformed records")
+    parser.add_argument("--api-key", help="Only accept this api-key")
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        districts=args.districts, years=args.years, end_year=args.end_year,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        max_page_size=args.max_page_size, throttle_every=args.throttle_every,
+        retry_after=args.retry_after, error_every=args.error_every,
+        bad_ratio=args.bad_ratio, api_key=args.api_key,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockDataGovServer((args.host, args.port), config_from_args(args))
+    print(f"Serving synthetic data.gov.in records on "
+          f"http://{args.host}:{server.server_port}/resource/<resource id>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Stats: {server.stats()}")
+
+if __name__ == "__main__":
+    main()
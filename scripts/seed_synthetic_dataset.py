@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Seed a synthetic national dataset for load testing
+Usage: python seed_synthetic_dataset.py [--districts 750] [--years 10] [--states 36] [--vertices 48] [--reset]
+
+Districts tile a jittered grid over India's bounding box. Each district is
+a polygon whose noisy edges are shared exactly with its neighbours, so
+boundaries neither overlap nor leave gaps, just like real ones. Monthly
+metrics use the data.gov.in field names and go through the same
+normalization, bulk upsert and derived-table refresh as a real ingestion
+run, so the API serves the data exactly as it would in production.
+
+--reset empties the districts and metrics tables first; never point it at
+a database holding real data.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import psycopg2.extras
+
+# Add parent directory to path to import from backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.db import (
+    get_db, return_db, init_db, mark_boundaries_updated, refresh_district_geometries
+)
+from app.ingest import (
+    BulkLoader, normalize_page, refresh_state_averages, refresh_district_summaries,
+    update_snapshot_metadata,
+)
+from mock_datagov_server import synthetic_records
+
+# Longitude/latitude bounds the grid is laid over
+INDIA_BOUNDS = (68.5, 8.0, 97.0, 35.5)
+RESET_TABLES = (
+    "mgnrega_raw", "mgnrega_monthly", "state_monthly_averages", "district_latest",
+    "state_snapshot_metadata", "snapshot_metadata", "districts",
+)
+
+Node = Tuple[int, int]
+
+class JitteredGrid:
+    """
+    A cols x rows grid whose corners are displaced at random and whose
+    edges are subdivided with noise. Noise is derived from the edge itself,
+    so the two districts sharing an edge get exactly the same vertices.
+    """
+
+    def __init__(self, cols: int, rows: int, bounds, vertices_per_edge: int, seed: int):
+        self.cols, self.rows = cols, rows
+        self.min_lon, self.min_lat, max_lon, max_lat = bounds
+        self.cell_w = (max_lon - self.min_lon) / cols
+        self.cell_h = (max_lat - self.min_lat) / rows
+        self.vertices_per_edge = vertices_per_edge
+        self.seed = seed
+        self._corners: Dict[Node, Tuple[float, float]] = {}
+
+    def corner(self, node: Node) -> Tuple[float, float]:
+        if node not in self._corners:
+            i, j = node
+            rng = random.Random(f"{self.seed}:corner:{i}:{j}")
+            # Corners on the outer boundary stay put
+            dx = rng.uniform(-0.25, 0.25) if 0 < i < self.cols else 0.0
+            dy = rng.uniform(-0.25, 0.25) if 0 < j < self.rows else 0.0
+            self._corners[node] = (
+                self.min_lon + (i + dx) * self.cell_w,
+                self.min_lat + (j + dy) * self.cell_h,
+            )
+        return self._corners[node]
+
+    def edge(self, a: Node, b: Node) -> List[Tuple[float, float]]:
+        """Points from corner a up to (not including) corner b"""
+        start, end = min(a, b), max(a, b)
+        (x0, y0), (x1, y1) = self.corner(start), self.corner(end)
+        rng = random.Random(f"{self.seed}:edge:{start}:{end}")
+        # Perpendicular displacement, a few smooth waves tapered to zero at
+        # both corners so neighbouring edges never cross
+        length = math.hypot(x1 - x0, y1 - y0) or 1.0
+        nx, ny = (y0 - y1) / length, (x1 - x0) / length
+        amplitude = 0.08 * min(self.cell_w, self.cell_h)
+        waves = [(rng.uniform(-1, 1), rng.randint(1, 4)) for _ in range(3)]
+        points = []
+        for k in range(self.vertices_per_edge):
+            t = k / self.vertices_per_edge
+            offset = amplitude * math.sin(math.pi * t) * sum(
+                weight * math.sin(math.pi * frequency * t) for weight, frequency in waves
+            ) / 3
+            points.append((x0 + (x1 - x0) * t + nx * offset, y0 + (y1 - y0) * t + ny * offset))
+        if (start, end) == (a, b):
+            return points
+        return [(x1, y1)] + points[:0:-1]
+
+    def polygon_wkt(self, i: int, j: int) -> str:
+        corners = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)]
+        ring: List[Tuple[float, float]] = []
+        for a, b in zip(corners, corners[1:] + corners[:1]):
+            ring.extend(self.edge(a, b))
+        ring.append(ring[0])
+        coords = ", ".join(f"{x:.6f} {y:.6f}" for x, y in ring)
+        return f"MULTIPOLYGON((({coords})))"
+
+def grid_shape(districts: int, bounds) -> Tuple[int, int]:
+    """Columns and rows with roughly square cells and at least `districts` cells"""
+    width, height = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    cols = max(1, round(math.sqrt(districts * width / height)))
+    return cols, math.ceil(districts / cols)
+
+def district_layout(districts: int, states: int) -> List[Tuple[str, str, int, int]]:
+    """(state_name, district_name, col, row) for each district"""
+    cols, _ = grid_shape(districts, INDIA_BOUNDS)
+    per_state = math.ceil(districts / states)
+    layout = []
+    for n in range(districts):
+        row = n // cols
+        # Serpentine order keeps each state's districts contiguous
+        col = n % cols if row % 2 == 0 else cols - 1 - n % cols
+        state = n // per_state
+        layout.append((f"SYNTHETIC STATE {state + 1:02d}", f"DISTRICT {n + 1:03d}", col, row))
+    return layout
+
+def reset_tables(conn):
+    cur = conn.cursor()
+    cur.execute(f"TRUNCATE {', '.join(RESET_TABLES)} RESTART IDENTITY CASCADE")
+    conn.commit()
+    cur.close()
+
+def insert_districts(conn, grid: JitteredGrid, layout) -> List[int]:
+    """Insert districts that do not exist yet; returns their ids"""
+    rows = []
+    for state, district, col, row in layout:
+        state_code = state.rsplit(" ", 1)[1]
+        rows.append((state, district, state_code, f"{state_code}{district.rsplit(' ', 1)[1]}",
+                     grid.polygon_wkt(col, row)))
+    cur = conn.cursor()
+    # Pooled connections carry the API's DB_STATEMENT_TIMEOUT_MS
+    cur.execute("SET LOCAL statement_timeout = 0")
+    inserted = psycopg2.extras.execute_values(cur, """
+        INSERT INTO districts (state_name, district_name, state_code, district_code, geom)
+        SELECT v.state_name, v.district_name, v.state_code, v.district_code,
+               ST_Multi(ST_GeomFromText(v.wkt, 4326))
+        FROM (VALUES %s) v (state_name, district_name, state_code, district_code, wkt)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM districts d
+            WHERE d.state_name = v.state_name AND d.district_name = v.district_name
+        )
+        RETURNING id
+    """, rows, page_size=100, fetch=True)
+    ids = [row[0] for row in inserted]
+    refresh_district_geometries(cur, ids)
+    if ids:
+        mark_boundaries_updated(cur)
+    conn.commit()
+    cur.close()
+    return ids
+
+def load_metrics(conn, layout, years: range, seed: int) -> Dict[str, int]:
+    """Normalize and upsert every district's history; returns rows per state"""
+    state_rows: Dict[str, int] = {}
+    cur = conn.cursor()
+    # Lifted again after every commit: each merge can rewrite 50000 rows
+    cur.execute("SET LOCAL statement_timeout = 0")
+    loader = BulkLoader(conn)
+    for state, district, _, _ in layout:
+        state_code = state.rsplit(" ", 1)[1]
+        records = synthetic_records(
+            state, district, state_code, f"{state_code}{district.rsplit(' ', 1)[1]}",
+            years, random.Random(f"{seed}:{state}:{district}")
+        )
+        rows, _ = normalize_page(records)
+        loader.stage(rows)
+        state_rows[state] = state_rows.get(state, 0) + len(rows)
+        # Merge in chunks to keep the staging table small
+        if loader.staged >= 50000:
+            loader.merge()
+            conn.commit()
+            cur.execute("SET LOCAL statement_timeout = 0")
+    loader.merge()
+    conn.commit()
+    cur.close()
+    return state_rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--districts", type=int, default=750)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--end-year", type=int, default=datetime.now().year - 1,
+                        help="Last year of history")
+    parser.add_argument("--states", type=int, default=36)
+    parser.add_argument("--vertices", type=int, default=48,
+                        help="Vertices per polygon edge (four edges per district)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true",
+                        help="Empty districts and metrics tables before seeding")
+    args = parser.parse_args()
+
+    years = range(args.end_year - args.years + 1, args.end_year + 1)
+    layout = district_layout(args.districts, args.states)
+    grid = JitteredGrid(*grid_shape(args.districts, INDIA_BOUNDS), INDIA_BOUNDS,
+                        args.vertices, args.seed)
+
+    init_db()
+    conn = get_db()
+    try:
+        if args.reset:
+            reset_tables(conn)
+            print(f"Emptied {', '.join(RESET_TABLES)}")
+
+        started = time.perf_counter()
+        ids = insert_districts(conn, grid, layout)
+        print(f"Inserted {len(ids)} districts ({len(layout) - len(ids)} already present) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        state_rows = load_metrics(conn, layout, years, args.seed)
+        print(f"Loaded {sum(state_rows.values())} monthly rows for {years.start}-{years.stop - 1} "
+              f"in {time.perf_counter() - started:.1f}s")
+    finally:
+        return_db(conn)
+
+    started = time.perf_counter()
+    refresh_state_averages()
+    refresh_district_summaries({(state, district) for state, district, _, _ in layout})
+    for state, rows in state_rows.items():
+        update_snapshot_metadata(state, rows)
+    print(f"Refreshed derived tables in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Report on-disk size of the metrics tables and the latency of the hot reads
+Usage: python table_sizes.py [--district-id 1] [--runs 200]
+
+Sizes include every partition of a partitioned table. Latencies are
+measured by running the API's query functions directly against the
+database, so they exclude HTTP and response caching.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path to import from backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app import queries
+from app.db import get_db, return_db
+
+TABLES = ("mgnrega_monthly", "mgnrega_raw", "district_latest", "state_monthly_averages")
+
+def table_sizes(cur, table: str):
+    """(rows, heap+toast bytes, index bytes) summed over all partitions, or None"""
+    cur.execute("SELECT to_regclass(%s)", (table,))
+    if cur.fetchone()[0] is None:
+        return None
+    # Leaf partitions of a partitioned table, or the plain table itself
+    cur.execute("""
+        SELECT COALESCE(SUM(c.reltuples) FILTER (WHERE c.reltuples > 0), 0)::bigint,
+               COALESCE(SUM(pg_table_size(c.oid)), 0),
+               COALESCE(SUM(pg_indexes_size(c.oid)), 0)
+        FROM pg_class c
+        WHERE c.relkind <> 'p'
+          AND c.oid = ANY(
+              ARRAY(SELECT relid FROM pg_partition_tree(%s::regclass))
+              || %s::regclass::oid
+          )
+    """, (table, table))
+    return cur.fetchone()
+
+def mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def time_query(conn, runs: int, fn, *args):
+    """Median and p95 latency in milliseconds"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(conn, *args)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def state_aggregate(conn, state_name: str):
+    """The per-state scan behind state_monthly_averages, for the district's state"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT year, month, COUNT(*), SUM(persondays), SUM(wages_lakhs)
+        FROM mgnrega_monthly
+        WHERE state_name = %s
+        GROUP BY year, month
+    """, (state_name,))
+    cur.fetchall()
+    cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--district-id", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("ANALYZE")
+        print(f"{'table':<26}{'rows':>12}{'table':>14}{'indexes':>14}")
+        for table in TABLES:
+            sizes = table_sizes(cur, table)
+            if sizes is None:
+                continue
+            rows, heap, indexes = sizes
+            print(f"{table:<26}{rows:>12}{mb(heap):>14}{mb(indexes):>14}")
+        cur.close()
+        conn.commit()
+
+        state_name = next(
+            d.state_name for d in queries.list_districts(conn) if d.id == args.district_id
+        )
+        print()
+        print(f"{'query':<26}{'p50 ms':>12}{'p95 ms':>14}")
+        for name, fn, fn_args in (
+            ("trends (12 months)", queries.get_district_trends, (args.district_id, 12)),
+            ("trends (all history)", queries.get_district_trends,
+             (args.district_id, 12, (1900, 1))),
+            ("state aggregate", state_aggregate, (state_name,)),
+        ):
+            p50, p95 = time_query(conn, args.runs, fn, *fn_args)
+            print(f"{name:<26}{p50:>12.2f}{p95:>14.2f}")
+        conn.commit()
+    finally:
+        return_db(conn)
+
+if __name__ == "__main__":
+    main()
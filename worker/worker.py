@@ -3,32 +3,115 @@ Celery worker for periodic data ingestion
 """
 import os
 import sys
-from celery import Celery
+import time
+from celery import Celery, chain, chord, group
 from celery.schedules import crontab
 
 # Add backend to path
 sys.path.insert(0, '/app/backend')
-from app.ingest import fetch_and_store
+from app.ingest import fetch_and_store, refresh_derived, DATAGOV_RATE_PER_SEC
 
 # Redis broker URL
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
-app = Celery('mgnrega_worker', broker=REDIS_URL)
+# States covered by the nightly fan-out, and how many may ingest at once.
+# The data.gov.in request rate is split evenly between the parallel lanes.
+# docker-compose passes unset variables as "", so empty values mean "unset".
+INGEST_STATE = os.getenv("INGEST_STATE") or "Uttar Pradesh"
+INGEST_STATES = [
+    state.strip()
+    for state in (os.getenv("INGEST_STATES") or INGEST_STATE).split(",")
+    if state.strip()
+]
+INGEST_MAX_PARALLEL = max(1, int(os.getenv("INGEST_MAX_PARALLEL") or "2"))
+
+# Chords need a result backend to collect the per-state results
+app = Celery('mgnrega_worker', broker=REDIS_URL, backend=REDIS_URL)
 
 @app.task
 def ingest_data():
     """Periodic task to ingest data from data.gov.in"""
-    state = os.getenv("INGEST_STATE", "Uttar Pradesh")
+    state = INGEST_STATE
     try:
         result = fetch_and_store(state)
-        return {"status": "success", "records": result}
+        return {"status": "success", **result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.task
+def ingest_state(results, state, rate=None):
+    """
+    Ingest one state without refreshing derived tables.
+
+    Chained per lane: receives the previous states' results and returns
+    them with this state's appended, so one failure does not stop the lane.
+    """
+    started = time.monotonic()
+    try:
+        counts = fetch_and_store(state, refresh=False, rate=rate)
+        outcome = {"state": state, "status": "success", **counts}
+    except Exception as e:
+        outcome = {"state": state, "status": "error", "message": str(e)}
+    outcome["duration_s"] = round(time.monotonic() - started, 2)
+    return results + [outcome]
+
+@app.task
+def finalize_ingestion(lane_results, started_at):
+    """Refresh derived tables once after every state has finished"""
+    states = [outcome for lane in lane_results for outcome in lane]
+    succeeded = {
+        outcome["state"]: outcome["records"]
+        for outcome in states if outcome["status"] == "success"
+    }
+
+    refresh_started = time.monotonic()
+    refresh_error = None
+    if succeeded:
+        try:
+            refresh_derived(succeeded)
+        except Exception as e:
+            # Rows stay pending and are refreshed by the next run
+            refresh_error = str(e)
+
+    if refresh_error is not None:
+        status = "error"
+    else:
+        status = "success" if len(succeeded) == len(states) else "partial"
+    return {
+        "status": status,
+        "refresh_error": refresh_error,
+        "succeeded": len(succeeded),
+        "failed": len(states) - len(succeeded),
+        "records": sum(succeeded.values()),
+        "refresh_duration_s": round(time.monotonic() - refresh_started, 2),
+        "duration_s": round(time.time() - started_at, 2),
+        "states": states,
+    }
+
+@app.task
+def ingest_all_states():
+    """Fan out one ingestion task per state, at most INGEST_MAX_PARALLEL at a time"""
+    lanes = [INGEST_STATES[i::INGEST_MAX_PARALLEL] for i in range(INGEST_MAX_PARALLEL)]
+    lanes = [lane for lane in lanes if lane]
+    if not lanes:
+        return {"status": "skipped", "states": 0, "lanes": 0}
+    rate = DATAGOV_RATE_PER_SEC / len(lanes)
+
+    lane_chains = [
+        chain(
+            ingest_state.s([], lane[0], rate),
+            *[ingest_state.s(state, rate) for state in lane[1:]]
+        )
+        for lane in lanes
+    ]
+    result = chord(group(lane_chains))(finalize_ingestion.s(time.time()))
+    return {"status": "scheduled", "states": len(INGEST_STATES), "lanes": len(lanes),
+            "task_id": result.id}
+
 # Schedule periodic tasks
 app.conf.beat_schedule = {
     'ingest-data-daily': {
-        'task': 'worker.worker.ingest_data',
+        'task': 'worker.worker.ingest_all_states',
         'schedule': crontab(hour=2, minute=0),  # Run daily at 2 AM
     },
 }
@@ -37,4 +120,3 @@ app.conf.timezone = 'UTC'
 
 if __name__ == '__main__':
     app.start()
-